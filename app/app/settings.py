@@ -37,6 +37,7 @@ DJANGO_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -84,8 +85,13 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 REST_AUTH_SERIALIZERS = {
     'USER_DETAILS_SERIALIZER': 'core.api.serializers.UserSerializer',
     'LOGIN_SERIALIZER': 'core.api.serializers.LoginSerializer',
+    'TOKEN_SERIALIZER': 'core.api.serializers.TokenSerializer',
 }
 
+# Lifetime in seconds of the signed access tokens returned at login and by
+# api/rest-auth/token/refresh/
+ACCESS_TOKEN_LIFETIME = int(os.environ.get('ACCESS_TOKEN_LIFETIME', 300))
+
 REST_AUTH_REGISTER_SERIALIZERS = {
     'REGISTER_SERIALIZER': 'core.api.serializers.RegisterSerializer',
 }
@@ -95,7 +101,8 @@ REST_AUTH_REGISTER_SERIALIZERS = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'core.api.authentication.CachedTokenAuthentication',
+        'core.api.authentication.AccessTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -104,6 +111,52 @@ REST_FRAMEWORK = {
         'core.api.pagination.StandardPageNumberPagination',
 }
 
+# HTML list pagination
+# Unfiltered tables estimated above this many rows skip the exact COUNT(*)
+PAGINATOR_ESTIMATE_THRESHOLD = int(
+    os.environ.get('PAGINATOR_ESTIMATE_THRESHOLD', 10000)
+)
+# Seconds an exact COUNT(*) is cached for the same queryset
+PAGINATOR_COUNT_CACHE_TTL = int(os.environ.get('PAGINATOR_COUNT_CACHE_TTL', 30))
+
+# In-memory tag/ingredient inverted index used by the recipe API filters
+RECIPE_INDEX_TTL = int(os.environ.get('RECIPE_INDEX_TTL', 300))
+RECIPE_INDEX_MAX_USERS = int(os.environ.get('RECIPE_INDEX_MAX_USERS', 1000))
+
+# Text search configuration of the recipe search vectors
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+# Maximum number of tag and ingredient name suggestions for '?q='
+TYPEAHEAD_LIMIT = int(os.environ.get('TYPEAHEAD_LIMIT', 10))
+
+# Maximum number of objects accepted by one bulk API request
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 1000))
+
+# Number of recipes fetched per server-side cursor round trip on export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Square thumbnail edges in pixels, each stored as JPEG and WebP next to
+# the original image. Generated by a pool of worker processes, or inline
+# when RECIPE_THUMBNAIL_WORKERS is 0.
+RECIPE_THUMBNAIL_SIZES = tuple(
+    int(size) for size in
+    os.environ.get('RECIPE_THUMBNAIL_SIZES', '160,640').split(',')
+)
+RECIPE_THUMBNAIL_QUALITY = int(os.environ.get('RECIPE_THUMBNAIL_QUALITY', 80))
+RECIPE_THUMBNAIL_WORKERS = int(os.environ.get('RECIPE_THUMBNAIL_WORKERS', 2))
+
+# Uploaded recipe images are turned upright, stripped of their metadata,
+# scaled down to RECIPE_IMAGE_MAX_EDGE pixels and re-encoded. Larger files
+# or pixel counts are rejected before decoding.
+RECIPE_IMAGE_MAX_EDGE = int(os.environ.get('RECIPE_IMAGE_MAX_EDGE', 2048))
+RECIPE_IMAGE_QUALITY = int(os.environ.get('RECIPE_IMAGE_QUALITY', 85))
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 100 * 1000 * 1000)
+)
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 20 * 1024 * 1024)
+)
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
@@ -113,7 +166,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -142,16 +195,96 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# Set DB_PGBOUNCER when connecting through a transaction pooling pgbouncer:
+# server side cursors (QuerySet.iterator()) would outlive the transaction
+# and end up on another client's server connection, so they are disabled
+# and iterator() results are fetched in one go. The time zone Django sets
+# is one of the parameters pgbouncer tracks for each client.
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # The postgresql backend with reuse health checks and pool metrics
+        'ENGINE': 'core.db',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Seconds a connection is kept for later requests, 0 closes it after
+        # every request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Check kept connections with 'SELECT 1' before reusing them
+        'CONN_HEALTH_CHECKS':
+            os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+# Hot standbys of the default database as comma separated host[:port], the
+# read only API actions are spread over them
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get(
+    'DB_REPLICA_HOSTS', ''
+).split(','))):
+    host, port = (replica.split(':') + [''])[:2]
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Tests read from the primary only, unless they opt in to replicas
+TEST_RUNNER = 'core.test_runner.PrimaryOnlyTestRunner'
+# After writing, a user reads from the primary for this many seconds. The
+# lag is sampled every core.db.routers.LAG_CHECK_INTERVAL seconds, so it
+# must stay above DATABASE_REPLICA_MAX_LAG plus that interval for users to
+# see their writes, which the 'core.E001' check enforces.
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.environ.get('DB_REPLICA_PIN_SECONDS', 15)
+)
+# Replicas further behind than this many seconds, or failing, are left out
+# for DATABASE_REPLICA_RETRY_SECONDS
+DATABASE_REPLICA_MAX_LAG = int(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+DATABASE_REPLICA_RETRY_SECONDS = int(
+    os.environ.get('DB_REPLICA_RETRY_SECONDS', 30)
+)
+# Cache holding the pins, shared by all workers
+DATABASE_REPLICA_CACHE_ALIAS = os.environ.get(
+    'DB_REPLICA_CACHE_ALIAS', 'default'
+)
+
+# Cache
+# Local memory by default, point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache (e.g. memcached) in production so all workers see the same data.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Cache holding the API list responses and the per-user data versions
+RESPONSE_CACHE_ALIAS = os.environ.get('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Users resolved from sessions and API tokens are kept in an in-process LRU
+# for AUTH_CACHE_LOCAL_TIMEOUT seconds, which bounds how long other workers
+# may see a logged out or deactivated user, and in the shared cache. Cached
+# users leave out the password hash but keep the session auth hash, an HMAC
+# of it keyed with SECRET_KEY, so use a cache only the app can reach.
+AUTH_CACHE_ALIAS = os.environ.get('AUTH_CACHE_ALIAS', 'default')
+AUTH_CACHE_TIMEOUT = int(os.environ.get('AUTH_CACHE_TIMEOUT', 300))
+AUTH_CACHE_LOCAL_TIMEOUT = int(os.environ.get('AUTH_CACHE_LOCAL_TIMEOUT', 5))
+AUTH_CACHE_LOCAL_SIZE = int(os.environ.get('AUTH_CACHE_LOCAL_SIZE', 1024))
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -203,3 +336,21 @@ STATICFILES_DIRS = (
 
 STATIC_ROOT = os.environ.get('STATIC_ROOT')
 MEDIA_ROOT = os.environ.get('MEDIA_ROOT')
+
+# How media files are handed to the front proxy: 'x-accel-redirect' for
+# nginx (under MEDIA_ACCEL_PREFIX, an internal location aliasing
+# MEDIA_ROOT), 'x-sendfile' for Apache or lighttpd, or empty to stream
+# them from Django
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Only serve recipe images to their owner and staff, otherwise to every
+# signed in user. Off by default, as the recipe pages list every user's
+# recipes and their images would fail to load.
+MEDIA_OWNER_ONLY = os.environ.get('MEDIA_OWNER_ONLY', '0') == '1'
+
+# Set to 'core.storage.ContentAddressedStorage' to name uploads by the
+# SHA-256 of their content in sharded directories and share identical files
+DEFAULT_FILE_STORAGE = os.environ.get(
+    'DEFAULT_FILE_STORAGE',
+    'django.core.files.storage.FileSystemStorage',
+)
@@ -15,13 +15,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 from django.contrib.auth.views import LoginView as BaseLoginView
 
 from django.views.generic import TemplateView
 
-from core.api.view_sets import LoginView
+from core.api.view_sets import AccessTokenRefreshView, DatabasePoolView, \
+    LoginView
+from recipe.views import RecipeImageMedia
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -34,8 +35,15 @@ urlpatterns = [
 
     # API
     path('api/recipe/', include('recipe.api.urls')),
+    path('api/db-pool/', DatabasePoolView.as_view(), name='db_pool'),
     path('api/rest-auth/', include('rest_auth.urls')),
     path('api/rest-auth/login/', LoginView.as_view(), name='rest_login'),
+    path('api/rest-auth/token/refresh/', AccessTokenRefreshView.as_view(),
+         name='token_refresh'),
     path('api/rest-auth/registration/', include('rest_auth.registration.urls'),
          name='rest_register'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+    # Media
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:name>',
+         RecipeImageMedia.as_view(), name='media'),
+]
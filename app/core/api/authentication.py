@@ -0,0 +1,63 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, \
+    TokenAuthentication, get_authorization_header
+
+from core.api.tokens import verify_access_token
+from core.auth import user_cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication resolving the user through the user cache
+       instead of querying Token and User on every request"""
+
+    def authenticate_credentials(self, key):
+        user = user_cache.get_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        # request.auth is the key rather than a Token, saving its query
+        return user, key
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """Authenticates 'Authorization: Bearer <access token>' headers.
+
+       The signature and expiry are checked without the database, and the
+       token version against the cached user, so revoked tokens fail."""
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+        claims = verify_access_token(token)
+        if claims is None:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid or expired token.')
+            )
+        user_id, version = claims
+        user = user_cache.load_user(user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        if user.token_version != version:
+            raise exceptions.AuthenticationFailed(_('Token was revoked.'))
+
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core.cache import bump_data_version
+
+
+class BulkModelMixin:
+    """Create, update and delete lists of user owned objects in a single
+       request and a single transaction.
+
+       POST takes a list of objects, PATCH a list of partial objects with
+       their 'id' and DELETE an object with a list of 'ids'. The whole batch
+       is validated before anything is written and errors are reported per
+       item, in the order of the payload."""
+
+    def get_bulk_items(self, request, key=None):
+        data = request.data
+        if key is not None:
+            data = data.get(key) if isinstance(data, dict) else None
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                'non_field_errors': [_('Expected a list of items.')]
+            })
+        if len(data) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError({
+                'non_field_errors': [
+                    _('Ensure there are no more than {max} items.').format(
+                        max=settings.BULK_MAX_ITEMS)
+                ]
+            })
+
+        return data
+
+    def get_bulk_queryset(self):
+        """Return the objects of the user, without the list filters and
+           typeahead limits get_queryset() applies"""
+        return self.queryset.filter(user=self.request.user)
+
+    def get_bulk_serializer(self, items, partial=False):
+        serializer = self.get_serializer(data=items, many=True,
+                                         partial=partial)
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request, *args, **kwargs):
+        """Create, update or delete a list of objects"""
+        handler = {
+            'POST': self.bulk_create,
+            'PATCH': self.bulk_update,
+            'DELETE': self.bulk_destroy,
+        }[request.method]
+
+        return handler(request)
+
+    def bulk_create(self, request):
+        items = self.get_bulk_items(request)
+        serializer = self.get_bulk_serializer(items)
+        model = serializer.child.Meta.model
+
+        instances = []
+        related = []
+        for data in serializer.validated_data:
+            data = dict(data)
+            related.append(self._pop_many_to_many(model, data))
+            instances.append(model(user=request.user, **data))
+
+        with transaction.atomic():
+            model.objects.bulk_create(instances)
+            self._replace_many_to_many(model, instances, related)
+            self.perform_bulk_write(instances, created=True)
+
+        # New objects have no links besides the ones just written
+        for field in model._meta.many_to_many:
+            for instance in instances:
+                if not self._has_cached(instance, field.name):
+                    self._cache_related(instance, field.name, [])
+
+        results = self.get_serializer(instances, many=True).data
+        return Response(results, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        items = self.get_bulk_items(request)
+        ids = [item.get('id') if isinstance(item, dict) else None
+               for item in items]
+        instances = self.get_bulk_queryset().in_bulk(
+            [pk for pk in ids if isinstance(pk, int)]
+        )
+        missing = [
+            {} if pk in instances else {'id': [_('Not found.')]}
+            for pk in ids
+        ]
+        if any(missing):
+            raise serializers.ValidationError(missing)
+
+        serializer = self.get_bulk_serializer(items, partial=True)
+        model = serializer.child.Meta.model
+
+        updated = []
+        related = []
+        fields = set()
+        for pk, data in zip(ids, serializer.validated_data):
+            data = dict(data)
+            instance = instances[pk]
+            related.append(self._pop_many_to_many(model, data))
+            for attr, value in data.items():
+                setattr(instance, attr, value)
+            fields.update(data)
+            updated.append(instance)
+
+        with transaction.atomic():
+            if fields:
+                model.objects.bulk_update(updated, fields)
+            self._replace_many_to_many(model, updated, related)
+            self.perform_bulk_write(updated, created=False)
+
+        for field in model._meta.many_to_many:
+            prefetch_related_objects(
+                [obj for obj in updated
+                 if not self._has_cached(obj, field.name)],
+                field.name,
+            )
+
+        results = self.get_serializer(updated, many=True).data
+        return Response(results, status=status.HTTP_200_OK)
+
+    def bulk_destroy(self, request):
+        ids = self.get_bulk_items(request, key='ids')
+        queryset = self.get_bulk_queryset().filter(
+            pk__in=[pk for pk in ids if isinstance(pk, int)]
+        )
+
+        with transaction.atomic():
+            found = set(queryset.values_list('pk', flat=True))
+            queryset.delete()
+
+        results = [
+            {'id': pk, 'status': 'deleted' if pk in found else 'not_found'}
+            for pk in ids
+        ]
+        return Response(results, status=status.HTTP_200_OK)
+
+    def perform_bulk_write(self, instances, created):
+        """Hook for the side effects the skipped model signals would have
+           triggered. Runs inside the bulk transaction, so cache changes
+           are registered with transaction.on_commit."""
+        user_id = self.request.user.id
+        # Bumped earlier, a concurrent read of the old rows would be cached
+        # under the new version
+        transaction.on_commit(lambda: bump_data_version(user_id))
+
+    def _pop_many_to_many(self, model, data):
+        return {
+            field.name: data.pop(field.name)
+            for field in model._meta.many_to_many if field.name in data
+        }
+
+    def _replace_many_to_many(self, model, instances, related):
+        """Replace the m2m links of the instances with bulk queries"""
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            source = f'{field.m2m_field_name()}_id'
+            target = f'{field.m2m_reverse_field_name()}_id'
+
+            changed = [
+                (instance, values[field.name])
+                for instance, values in zip(instances, related)
+                if field.name in values
+            ]
+            if not changed:
+                continue
+
+            through.objects.filter(**{
+                f'{source}__in': [instance.pk for instance, objs in changed]
+            }).delete()
+            through.objects.bulk_create(
+                through(**{source: instance.pk, target: obj.pk})
+                for instance, objs in changed for obj in objs
+            )
+
+            for instance, objs in changed:
+                self._cache_related(instance, field.name, objs)
+
+    def _has_cached(self, instance, name):
+        return name in getattr(instance, '_prefetched_objects_cache', {})
+
+    def _cache_related(self, instance, name, objs):
+        """Store the written relation like prefetch_related would, so the
+           response is serialized without querying it back"""
+        queryset = getattr(instance, name).all()
+        queryset._result_cache = list(objs)
+        queryset._prefetch_done = True
+        if not hasattr(instance, '_prefetched_objects_cache'):
+            instance._prefetched_objects_cache = {}
+        instance._prefetched_objects_cache[name] = queryset
@@ -0,0 +1,120 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from core.cache import response_cache, get_data_version
+from core.db.routers import read_alias
+
+
+def request_digest(request):
+    """Return a digest of the host, path, normalized query params and the
+       negotiated format, as e.g. JSON and the browsable API share URLs"""
+    params = sorted(
+        (key, request.query_params.getlist(key))
+        for key in request.query_params
+    )
+    renderer = getattr(request, 'accepted_renderer', None)
+    fmt = renderer.format if renderer is not None else ''
+    return hashlib.md5(
+        f'{request.get_host()}{request.path}{params}:{fmt}'.encode()
+    ).hexdigest()
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('Precondition failed.')
+    default_code = 'precondition_failed'
+
+
+class ConditionalListMixin:
+    """Strong ETags derived from the user's data version.
+
+       The ETag is computed without touching the database or serializing
+       anything, and a matching 'If-None-Match' returns 304. Responses read
+       from a replica get none, as they may predate the data version."""
+
+    def get_etag(self, request):
+        user_id = request.user.id
+        version = get_data_version(user_id)
+        digest = hashlib.md5(
+            f'{user_id}:{version}:{request_digest(request)}'.encode()
+        ).hexdigest()
+        return quote_etag(digest)
+
+    def etag_matches(self, header, etag):
+        etags = parse_etags(header or '')
+        return '*' in etags or etag in etags
+
+    def conditional_read(self, handler, request, *args, **kwargs):
+        """Run the read handler unless the client's copy is current"""
+        etag = self.get_etag(request)
+        if self.etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED,
+                                headers={'ETag': etag})
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and \
+                    read_alias() is None:
+                response['ETag'] = etag
+        # The ETag depends on the negotiated format
+        patch_vary_headers(response, ['Accept'])
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_read(super().list, request, *args, **kwargs)
+
+
+class ConditionalDetailMixin(ConditionalListMixin):
+    """Adds ETags to detail reads and 'If-Match' checks to updates"""
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_read(super().retrieve, request,
+                                     *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if if_match is not None and not self.etag_matches(
+            if_match, self.get_etag(request)
+        ):
+            raise PreconditionFailed()
+
+        response = super().update(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            # The write bumped the data version
+            response['ETag'] = self.get_etag(request)
+
+        return response
+
+
+class UserListCacheMixin:
+    """Cache list responses per user, endpoint and normalized query params.
+
+       Entries are keyed on the user's data version, so any write to the
+       user's data makes the old entries unreachable. Responses read from
+       a replica aren't cached, as they may predate the data version."""
+
+    def list_cache_key(self, request):
+        user_id = request.user.id
+        version = get_data_version(user_id)
+        return f'api-list:{user_id}:{version}:{request_digest(request)}'
+
+    def list(self, request, *args, **kwargs):
+        cache = response_cache()
+        key = self.list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and \
+                read_alias() is None:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+
+        return response
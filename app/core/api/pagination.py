@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 
 class SmallPageNumberPagination(PageNumberPagination):
@@ -17,3 +17,79 @@ class LargePageNumberPagination(PageNumberPagination):
     page_size = 10
     max_page_size = 50
     page_size_query_param = 'page_size'
+
+
+class StandardCursorPagination(CursorPagination):
+    """Keyset pagination on '-id', without COUNT(*) and OFFSET scans"""
+    page_size = 5
+    max_page_size = 10
+    page_size_query_param = 'page_size'
+    ordering = ('-id',)
+
+
+class NameCursorPagination(StandardCursorPagination):
+    """Keyset pagination on '-name', with '-id' as a tie breaker"""
+    ordering = ('-name', '-id')
+
+
+class CursorOptInPagination(StandardPageNumberPagination):
+    """Page number pagination by default, switching to cursor pagination
+       when the client asks for it with '?pagination=cursor' or sends
+       a 'cursor' token. Querysets ordered differently, e.g. by search
+       rank, stay on page numbers as the cursor would reorder them."""
+    pagination_query_param = 'pagination'
+    cursor_pagination_class = StandardCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        """Return True if the request opts in to cursor pagination"""
+        params = request.query_params
+        mode = params.get(self.pagination_query_param)
+        return mode == 'cursor' or (
+            self.cursor_pagination_class.cursor_query_param in params
+        )
+
+    def keeps_ordering(self, queryset):
+        """Return whether the cursor ordering refines the queryset's own"""
+        ordering = tuple(queryset.query.order_by)
+        return self.cursor_pagination_class.ordering[:len(ordering)] == \
+            ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request) and self.keeps_ordering(queryset):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view=view
+            )
+
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    @property
+    def display_page_controls(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.display_page_controls
+
+        return getattr(self, '_display_page_controls', False)
+
+    @display_page_controls.setter
+    def display_page_controls(self, value):
+        self._display_page_controls = value
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+
+        return super().to_html()
+
+
+class NameCursorOptInPagination(CursorOptInPagination):
+    cursor_pagination_class = NameCursorPagination
@@ -0,0 +1,46 @@
+from django.db import InterfaceError, OperationalError
+from rest_framework.permissions import SAFE_METHODS
+
+from core.db.routers import is_pinned, mark_unavailable, pin_to_primary, \
+    read_alias, use_primary, use_replica
+
+
+class ReplicaReadMixin:
+    """Serve safe method requests from a read replica.
+
+       Users are pinned to the primary for DATABASE_REPLICA_PIN_SECONDS
+       after any other request, so they read their own writes. A replica
+       losing its connection during the request is taken out of rotation
+       and the request is served again from the primary."""
+
+    # Cleared to serve the retry of a failed request from the primary
+    read_from_replica = True
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permissions run on the primary
+        super().initial(request, *args, **kwargs)
+        if self.read_from_replica and request.method in SAFE_METHODS and \
+                not is_pinned(request.user.id):
+            use_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and \
+                request.user.is_authenticated:
+            pin_to_primary(request.user.id)
+
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            # Other database errors would fail on the primary as well
+            alias = read_alias()
+            if alias is None:
+                raise
+            mark_unavailable(alias)
+            use_primary()
+            self.read_from_replica = False
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            use_primary()
@@ -3,7 +3,8 @@ from django.utils.translation import ugettext_lazy as _
 
 from rest_auth.registration.serializers import \
     RegisterSerializer as BaseRegisterSerializer
-from rest_auth.serializers import LoginSerializer as BaseLoginSerializer
+from rest_auth.serializers import LoginSerializer as BaseLoginSerializer, \
+    TokenSerializer as BaseTokenSerializer
 
 from allauth.account import app_settings as allauth_settings
 from allauth.utils import email_address_exists
@@ -12,6 +13,8 @@ from allauth.account.utils import setup_user_email
 
 from rest_framework import serializers
 
+from .tokens import issue_access_token
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object"""
@@ -107,3 +110,19 @@ class RegisterSerializer(BaseRegisterSerializer):
 class LoginSerializer(BaseLoginSerializer):
     # Removing username to use only email
     username = None
+
+
+class TokenSerializer(BaseTokenSerializer):
+    """Login response with the API token, which is also the refresh token,
+       and a signed access token"""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['access_token'], data['access_token_expires'] = \
+            issue_access_token(instance.user)
+        return data
+
+
+class AccessTokenSerializer(serializers.Serializer):
+    access_token = serializers.CharField(read_only=True)
+    access_token_expires = serializers.IntegerField(read_only=True)
@@ -0,0 +1,55 @@
+import base64
+import hashlib
+import hmac
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from core.auth import invalidate_on_commit, user_cache
+
+ACCESS_TOKEN_SALT = b'core.api.tokens.access'
+
+
+def _signature(payload):
+    key = hashlib.sha256(ACCESS_TOKEN_SALT + settings.SECRET_KEY.encode())
+    digest = hmac.new(key.digest(), payload.encode(), hashlib.sha256)
+    return base64.urlsafe_b64encode(digest.digest()).rstrip(b'=').decode()
+
+
+def issue_access_token(user, lifetime=None):
+    """Return a signed access token for the user and its expiry time.
+
+       The token is '<user id>.<token version>.<expires>.<signature>'. It
+       is checked without the database and stops working when it expires or
+       when the user's token version is bumped."""
+    lifetime = lifetime or settings.ACCESS_TOKEN_LIFETIME
+    expires = int(time.time()) + lifetime
+    payload = f'{user.pk}.{user.token_version}.{expires}'
+
+    return f'{payload}.{_signature(payload)}', expires
+
+
+def verify_access_token(token):
+    """Return the (user id, token version) of a valid, unexpired access
+       token, None otherwise"""
+    try:
+        payload, signature = token.rsplit('.', 1)
+        user_id, version, expires = (int(part) for part in payload.split('.'))
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _signature(payload)):
+        return None
+    if expires < time.time():
+        return None
+
+    return user_id, version
+
+
+def revoke_access_tokens(user_id):
+    """Invalidate every access token issued to the user so far"""
+    get_user_model()._default_manager.filter(pk=user_id).update(
+        token_version=F('token_version') + 1
+    )
+    invalidate_on_commit(user_cache.invalidate_user, user_id)
@@ -1,10 +1,18 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from rest_auth.registration.views import RegisterView as BaseRegisterView,\
                                          LoginView as BaseLoginView
 
-from .serializers import UserSerializer
+from core.db.base import pool_metrics
+from .authentication import AccessTokenAuthentication, \
+    CachedTokenAuthentication
+from .serializers import AccessTokenSerializer, UserSerializer
+from .tokens import issue_access_token
 from django.contrib.auth import get_user_model
+from django.db import connection
 
 User = get_user_model()
 
@@ -12,7 +20,8 @@ User = get_user_model()
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,
+                              AccessTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
@@ -20,6 +29,22 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
+class AccessTokenRefreshView(generics.GenericAPIView):
+    """Exchange the API token for a new signed access token"""
+    serializer_class = AccessTokenSerializer
+    # Checked against the Token table, never a cached copy
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        access_token, expires = issue_access_token(request.user)
+        serializer = self.get_serializer({
+            'access_token': access_token,
+            'access_token_expires': expires,
+        })
+        return Response(serializer.data)
+
+
 # Rest-Auth Override
 class RegisterView(BaseRegisterView):
     """Registers a new User in the system"""
@@ -29,3 +54,18 @@ class RegisterView(BaseRegisterView):
 class LoginView(BaseLoginView):
     """Login with credentials in the system"""
     queryset = User.objects.all()
+
+
+class DatabasePoolView(APIView):
+    """Connection counters of the worker process serving the request"""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        settings_dict = connection.settings_dict
+        return Response({
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS', False),
+            'server_side_cursors':
+                not settings_dict['DISABLE_SERVER_SIDE_CURSORS'],
+            'connections': pool_metrics(),
+        })
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+class LRUCache:
+    """Thread safe in-process cache dropping the least recently used entry
+       when full and every entry 'timeout' seconds after it was set"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class UserCache:
+    """Two level cache of the users resolved by id and by API token.
+
+       Lookups hit the in-process LRU first, then the shared cache, so
+       most requests resolve their user without a query. Invalidations
+       clear both levels, but other processes keep their local copy for up
+       to AUTH_CACHE_LOCAL_TIMEOUT seconds.
+
+       Users are cached as their field values without the password hash,
+       with the session auth hash derived from it instead."""
+
+    # Left out of the cache, loaded from the database when read
+    excluded_fields = ('password',)
+
+    def __init__(self):
+        self.local = LRUCache(settings.AUTH_CACHE_LOCAL_SIZE,
+                              settings.AUTH_CACHE_LOCAL_TIMEOUT)
+
+    @property
+    def shared(self):
+        return caches[settings.AUTH_CACHE_ALIAS]
+
+    def _user_key(self, user_id):
+        return f'auth:user-fields:{user_id}'
+
+    def _token_key(self, key):
+        return f'auth:token:{key}'
+
+    def _get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+
+        return value
+
+    def _set(self, key, value):
+        self.local.set(key, value)
+        self.shared.set(key, value, settings.AUTH_CACHE_TIMEOUT)
+
+    def _delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def get_user(self, user_id):
+        """Return the cached user, a fresh instance on every call so
+           requests can't change each other's. Its excluded fields are
+           deferred."""
+        data = self._get(self._user_key(user_id))
+        if data is None:
+            return None
+
+        data = dict(data)
+        session_auth_hash = data.pop('session_auth_hash')
+        User = get_user_model()
+        names = [field.attname for field in User._meta.concrete_fields
+                 if field.attname in data]
+        user = User.from_db(DEFAULT_DB_ALIAS, names,
+                            [data[name] for name in names])
+        user._session_auth_hash = session_auth_hash
+
+        return user
+
+    def set_user(self, user):
+        data = {
+            field.attname: getattr(user, field.attname)
+            for field in user._meta.concrete_fields
+            if field.attname not in self.excluded_fields
+        }
+        data['session_auth_hash'] = user.get_session_auth_hash()
+        self._set(self._user_key(user.pk), data)
+
+    def get_session_auth_hash(self, user):
+        """Return the session auth hash of the user without loading the
+           password of a cached user"""
+        session_auth_hash = getattr(user, '_session_auth_hash', None)
+        return session_auth_hash or user.get_session_auth_hash()
+
+    def get_token_user(self, key):
+        """Return the user of the API token, loading and caching it on a
+           miss. Returns None for unknown tokens."""
+        user_id = self._get(self._token_key(key))
+        user = self.get_user(user_id) if user_id is not None else None
+        if user is not None:
+            return user
+
+        from rest_framework.authtoken.models import Token
+        token = Token.objects.select_related('user').filter(key=key).first()
+        if token is None:
+            return None
+        self._set(self._token_key(key), token.user_id)
+        self.set_user(token.user)
+
+        return token.user
+
+    def load_user(self, user_id):
+        """Return the user with the id, loading and caching it on a miss.
+           Returns None for unknown users."""
+        user = self.get_user(user_id)
+        if user is not None:
+            return user
+
+        User = get_user_model()
+        user = User._default_manager.filter(pk=user_id).first()
+        if user is not None:
+            self.set_user(user)
+
+        return user
+
+    def invalidate_user(self, user_id):
+        self._delete(self._user_key(user_id))
+
+    def invalidate_token(self, key):
+        self._delete(self._token_key(key))
+
+
+user_cache = UserCache()
+
+
+def invalidate_on_commit(invalidate, key):
+    """Invalidate now, and again once committed as a concurrent request
+       may have cached the old row meanwhile"""
+    invalidate(key)
+    transaction.on_commit(lambda: invalidate(key))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from core.db.routers import pin_to_primary
+
+
+def response_cache():
+    """Return the cache backend shared by the response caches"""
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _data_version_key(user_id):
+    return f'data-version:{user_id}'
+
+
+def get_data_version(user_id):
+    """Return the version of the data owned by the user"""
+    return response_cache().get(_data_version_key(user_id), 0)
+
+
+def bump_data_version(user_id):
+    """Invalidate everything cached for the user's previous data version"""
+    # Whatever wrote the data, the user's next reads go to the primary
+    pin_to_primary(user_id)
+    cache = response_cache()
+    key = _data_version_key(user_id)
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(key, 1, None)
+        return 1
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from core.db.routers import LAG_CHECK_INTERVAL
+
+
+@register()
+def check_replica_pin(app_configs, **kwargs):
+    """Users must stay pinned to the primary until any replica still in
+       rotation caught up with their writes"""
+    if not settings.DATABASE_REPLICAS:
+        return []
+
+    window = settings.DATABASE_REPLICA_MAX_LAG + LAG_CHECK_INTERVAL
+    if settings.DATABASE_REPLICA_PIN_SECONDS > window:
+        return []
+
+    return [Error(
+        'DATABASE_REPLICA_PIN_SECONDS must be greater than '
+        f'DATABASE_REPLICA_MAX_LAG plus {LAG_CHECK_INTERVAL} seconds.',
+        hint='Replicas are only checked for lag every '
+             f'{LAG_CHECK_INTERVAL} seconds, so they may be up to '
+             f'{window} seconds behind.',
+        id='core.E001',
+    )]
@@ -0,0 +1,82 @@
+"""PostgreSQL backend for persistent, health checked connections.
+
+Use it with ENGINE 'core.db'. On top of the postgresql backend it:
+
+- checks a reused connection with a cheap query before the first query of
+  each request when CONN_HEALTH_CHECKS is set, so a connection the server
+  or a proxy dropped while idle doesn't fail the request,
+- counts the connections opened, reused, discarded and failed in this
+  process, see pool_metrics().
+"""
+import threading
+from collections import Counter
+
+from django.db.backends.postgresql import base
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def _count(event):
+    with _metrics_lock:
+        _metrics[event] += 1
+
+
+def pool_metrics():
+    """Return the connection counters of this process"""
+    with _metrics_lock:
+        return {
+            event: _metrics[event]
+            for event in ('opened', 'reused', 'discarded', 'failed')
+        }
+
+
+def reset_pool_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def health_checks_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            _count('failed')
+            raise
+
+        _count('opened')
+        return connection
+
+    def connect(self):
+        # A fresh connection needs no check, and connect() itself calls
+        # ensure_connection() before autocommit is set
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        # Runs when a request starts and finishes
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done:
+            self.health_check_done = True
+            if self.health_checks_enabled and not self.in_atomic_block:
+                if self.is_usable():
+                    _count('reused')
+                else:
+                    _count('discarded')
+                    self.close()
+            else:
+                _count('reused')
+
+        super().ensure_connection()
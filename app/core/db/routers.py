@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Seconds between two replication lag checks of a replica
+LAG_CHECK_INTERVAL = 5
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_local = threading.local()
+_state_lock = threading.Lock()
+# Replica alias => time.monotonic() until which it isn't used
+_down_until = {}
+# Replica alias => time.monotonic() of its last lag check
+_lag_checked_at = {}
+
+
+def read_alias():
+    """Return the replica reads of the current request go to, if any"""
+    return getattr(_local, 'alias', None)
+
+
+def use_replica():
+    """Send the reads of the current thread to an available replica, or to
+       the primary when there is none. Returns the chosen alias or None."""
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    _local.alias = next(
+        (alias for alias in replicas if replica_available(alias)), None
+    )
+    return _local.alias
+
+
+def use_primary():
+    _local.alias = None
+
+
+def mark_unavailable(alias):
+    """Stop using the replica for DATABASE_REPLICA_RETRY_SECONDS"""
+    with _state_lock:
+        _down_until[alias] = \
+            time.monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+
+
+def replica_lag(alias):
+    """Return how many seconds the replica is behind the primary, None
+       when it hasn't replayed anything yet"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+
+    return float(lag) if lag is not None else None
+
+
+def replica_available(alias):
+    """Return whether the replica is up and close enough to the primary"""
+    now = time.monotonic()
+    with _state_lock:
+        if _down_until.get(alias, 0) > now:
+            return False
+        check_lag = _lag_checked_at.get(alias, 0) + LAG_CHECK_INTERVAL < now
+        if check_lag:
+            _lag_checked_at[alias] = now
+
+    try:
+        connections[alias].ensure_connection()
+        if check_lag:
+            lag = replica_lag(alias)
+            if lag is None or lag > settings.DATABASE_REPLICA_MAX_LAG:
+                mark_unavailable(alias)
+                return False
+    except DatabaseError:
+        mark_unavailable(alias)
+        return False
+
+    return True
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Read the user's data from the primary for a while after a write, so
+       they see their own changes while the replicas catch up"""
+    caches[settings.DATABASE_REPLICA_CACHE_ALIAS].set(
+        _pin_key(user_id), True, settings.DATABASE_REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned(user_id):
+    return caches[settings.DATABASE_REPLICA_CACHE_ALIAS].get(
+        _pin_key(user_id), False
+    )
+
+
+class ReplicaRouter:
+    """Sends reads to the replica chosen for the current request and
+       everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica are saved to the primary as well
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db == DEFAULT_DB_ALIAS
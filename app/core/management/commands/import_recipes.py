@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.cache import bump_data_version
+from core.models import ImportCheckpoint
+from recipe.inverted_index import drop_index
+from recipe.models import Ingredient, Recipe, Tag
+from recipe.search import update_search_vectors
+
+RECIPE_FIELDS = ('title', 'time_minutes', 'price', 'link')
+RELATED_FIELDS = (('tags', Tag), ('ingredients', Ingredient))
+
+
+def read_csv(path, separator):
+    """Yield the rows of a CSV file, splitting the related names"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for field_name, model in RELATED_FIELDS:
+                names = row.get(field_name) or ''
+                row[field_name] = names.split(separator) if names else []
+            yield row
+
+
+def read_jsonl(path):
+    """Yield the objects of a JSON lines file"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Load the rows into the table with a single COPY"""
+    buffer = io.StringIO()
+    # Quote every value so empty strings are not read back as NULL
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+class Command(BaseCommand):
+    """Django command to load recipes from a CSV or JSON lines dump"""
+
+    help = ('Import recipes from a CSV or JSON lines file, creating missing '
+            'tags and ingredients by name')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON lines file')
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help='File format, guessed from the extension by default',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the owner of rows without a "user" column',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows loaded per transaction',
+        )
+        parser.add_argument(
+            '--separator', default=';',
+            help='Separator of tag and ingredient names in CSV columns',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Name of the checkpoint recording the imported rows, the '
+                 'absolute path of the file by default',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint and import from the start',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File "{path}" does not exist.')
+
+        fmt = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+        )
+        rows = read_jsonl(path) if fmt == 'jsonl' else read_csv(
+            path, options['separator']
+        )
+        checkpoint = options['checkpoint'] or os.path.abspath(path)
+        batch_size = options['batch_size']
+        self.default_user = options['user']
+        self.users = {}
+
+        done = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if done:
+            self.stdout.write(f'Resuming after row {done}...')
+            # Resuming still parses the skipped rows, but loads nothing
+            for _ in islice(rows, done):
+                pass
+
+        started = time.monotonic()
+        imported = skipped = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            recipes = []
+            for number, row in enumerate(batch, start=done + 1):
+                try:
+                    recipes.append(self.clean_row(row))
+                except (ValidationError, ValueError, TypeError) as e:
+                    skipped += 1
+                    self.stderr.write(f'Row {number}: {e}')
+
+            with transaction.atomic():
+                user_ids = self.load(recipes)
+                self.write_checkpoint(checkpoint, done + len(batch))
+            for user_id in user_ids:
+                bump_data_version(user_id)
+                drop_index(user_id)
+
+            done += len(batch)
+            imported += len(recipes)
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'Imported {imported} recipes ({rate:.0f} rows/s)...'
+            )
+
+        elapsed = time.monotonic() - started
+        ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes in {elapsed:.1f}s '
+            f'({imported / max(elapsed, 1e-6):.0f} rows/s), '
+            f'skipped {skipped} rows'
+        ))
+
+    def read_checkpoint(self, checkpoint):
+        return ImportCheckpoint.objects.filter(
+            name=checkpoint
+        ).values_list('rows', flat=True).first() or 0
+
+    def write_checkpoint(self, checkpoint, rows):
+        """Record the loaded rows in the transaction of the batch, so they
+           commit or roll back together"""
+        ImportCheckpoint.objects.update_or_create(
+            name=checkpoint, defaults={'rows': rows}
+        )
+
+    def get_user_id(self, email):
+        email = email or self.default_user
+        if not email:
+            raise ValueError('No user for the row, pass --user.')
+        if email not in self.users:
+            user_id = get_user_model().objects.filter(
+                email=email
+            ).values_list('id', flat=True).first()
+            if user_id is None:
+                raise ValueError(f'User "{email}" does not exist.')
+            self.users[email] = user_id
+
+        return self.users[email]
+
+    def clean_row(self, row):
+        """Validate a row with the model fields and return its values"""
+        recipe = {'user_id': self.get_user_id(row.get('user'))}
+        for name in RECIPE_FIELDS:
+            field = Recipe._meta.get_field(name)
+            value = row.get(name)
+            try:
+                recipe[name] = field.clean(
+                    '' if value is None and field.blank else value, None
+                )
+            except ValidationError as e:
+                raise ValidationError({name: e.messages})
+
+        for field_name, model in RELATED_FIELDS:
+            field = model._meta.get_field('name')
+            names = row.get(field_name) or []
+            if isinstance(names, str):
+                raise ValueError(f'"{field_name}" must be a list of names.')
+            recipe[field_name] = list(dict.fromkeys(
+                field.clean(str(name).strip(), None) for name in names
+            ))
+
+        return recipe
+
+    def resolve_names(self, model, recipes, field_name):
+        """Return the ids of the named objects of the batch by user and
+           name, creating the missing ones"""
+        wanted = {
+            (recipe['user_id'], name)
+            for recipe in recipes for name in recipe[field_name]
+        }
+        if not wanted:
+            return {}
+
+        existing = model.objects.filter(
+            user_id__in={user_id for user_id, name in wanted},
+            name__in={name for user_id, name in wanted},
+        ).order_by('-id').values_list('user_id', 'name', 'id')
+        # Names are not unique per user, the oldest object wins
+        ids = {(user_id, name): pk for user_id, name, pk in existing}
+
+        missing = [
+            model(user_id=user_id, name=name)
+            for user_id, name in sorted(wanted - ids.keys())
+        ]
+        for obj in model.objects.bulk_create(missing):
+            ids[obj.user_id, obj.name] = obj.pk
+
+        return ids
+
+    def load(self, recipes):
+        """Load the cleaned recipes and their links of one batch.
+           Returns the ids of the users owning them."""
+        if not recipes:
+            return set()
+
+        related = {
+            field_name: self.resolve_names(model, recipes, field_name)
+            for field_name, model in RELATED_FIELDS
+        }
+        now = timezone.now()
+
+        with connection.cursor() as cursor:
+            # Reserve the ids up front, COPY can not return them
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [Recipe._meta.db_table, 'id', len(recipes)],
+            )
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+
+            copy_rows(
+                cursor, Recipe._meta.db_table,
+                ('id', 'user_id', 'created_on', 'image_placeholder',
+                 'image_color', 'image_sizes') + RECIPE_FIELDS,
+                (
+                    [pk, recipe['user_id'], now.isoformat(), '', '', '{}'] +
+                    [recipe[name] for name in RECIPE_FIELDS]
+                    for pk, recipe in zip(recipe_ids, recipes)
+                ),
+            )
+
+            for field_name, model in RELATED_FIELDS:
+                field = Recipe._meta.get_field(field_name)
+                copy_rows(
+                    cursor, field.remote_field.through._meta.db_table,
+                    (f'{field.m2m_field_name()}_id',
+                     f'{field.m2m_reverse_field_name()}_id'),
+                    (
+                        (pk, related[field_name][recipe['user_id'], name])
+                        for pk, recipe in zip(recipe_ids, recipes)
+                        for name in recipe[field_name]
+                    ),
+                )
+
+        update_search_vectors(recipe_ids)
+
+        return {recipe['user_id'] for recipe in recipes}
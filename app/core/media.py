@@ -0,0 +1,127 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+# Content addressed files never change, everything else may be replaced
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+CACHE_CONTROL = 'private, max-age=3600'
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    """Return the (start, end) byte positions, end included, asked for by a
+       single range 'Range' header. None means the whole file, and a range
+       past the end of the file raises ValueError."""
+    match = RANGE_RE.match(header or '')
+    if not match or not (match.group('start') or match.group('end')):
+        # Missing, malformed or multiple ranges: send the whole file
+        return None
+
+    start, end = match.group('start'), match.group('end')
+    if not start:
+        # 'bytes=-N' asks for the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+
+    return start, end
+
+
+def read_range(f, start, length, chunk_size=64 * 1024):
+    """Yield 'length' bytes of the file from 'start' in chunks"""
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def accel_response(name, path, content_type):
+    """Hand the file over to the front proxy, which then serves it"""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL_REDIRECT == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = \
+            f'{settings.MEDIA_ACCEL_PREFIX.rstrip("/")}/{name}'
+    else:
+        response['X-Sendfile'] = path
+
+    return response
+
+
+def serve_file(request, name, path, immutable=False):
+    """Respond with the file at 'path' without reading it into memory.
+
+       With MEDIA_ACCEL_REDIRECT set the front proxy sends the bytes.
+       Otherwise the file is streamed with ETag, Last-Modified and single
+       'Range' support."""
+    stat = os.stat(path)
+    content_type = mimetypes.guess_type(path)[0] or \
+        'application/octet-stream'
+    etag = file_etag(stat)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = accel_response(name, path, content_type)
+        else:
+            response = range_response(request, path, stat, etag,
+                                      content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable \
+        else CACHE_CONTROL
+
+    return response
+
+
+def range_response(request, path, stat, etag, content_type):
+    size = stat.st_size
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # A stale 'If-Range' validator asks for the whole new file instead
+    if if_range is None or etag in parse_etags(if_range) or \
+            if_range == http_date(stat.st_mtime):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(open(path, 'rb'), start, end - start + 1),
+            status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -50,6 +50,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     last_name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Bumped to revoke the signed access tokens issued so far
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     USERNAME_FIELD = 'email'
 
     objects = UserManager()
@@ -60,3 +62,24 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email
+
+
+class StoredFile(models.Model):
+    """Reference count of a content addressed file in the media storage"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class ImportCheckpoint(models.Model):
+    """Rows of an import file already loaded, written in the transaction
+       of each batch so a resumed import never loads a batch twice"""
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,71 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator which avoids running COUNT(*) on every request.
+
+       Unfiltered querysets over large Postgres tables are counted with the
+       planner's 'reltuples' estimate. Every other queryset is counted
+       exactly once and the result is cached for a short TTL."""
+
+    @cached_property
+    def count(self):
+        """Return the (possibly estimated) number of objects"""
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+
+        estimate = self.estimated_count()
+        threshold = settings.PAGINATOR_ESTIMATE_THRESHOLD
+        if estimate is not None and estimate > threshold:
+            return estimate
+
+        key = self.count_cache_key()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_CACHE_TTL)
+
+        return count
+
+    def estimated_count(self):
+        """Return the 'reltuples' estimate for an unfiltered queryset or
+           None when no usable estimate exists"""
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+
+        # Tables which were never analyzed report 0 or -1
+        if row is None or row[0] <= 0:
+            return None
+
+        return int(row[0])
+
+    def count_cache_key(self):
+        """Return the cache key of the exact count for this queryset"""
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        return f'paginator-count:{self.object_list.db}:{digest}'
+
+    def page_window(self, number, size=5):
+        """Return the page numbers around 'number' without building
+           the whole page range"""
+        index = number - 1
+        max_index = self.num_pages
+        start_index = index - size if index >= size else 0
+        end_index = index + size if index <= max_index - size else max_index
+
+        return range(start_index + 1, end_index + 1)
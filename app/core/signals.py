@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.api.tokens import revoke_access_tokens
+from core.auth import invalidate_on_commit, user_cache
+
+User = get_user_model()
+
+# Changing any of these revokes the user's access tokens, other changes
+# (e.g. groups) call revoke_access_tokens() themselves
+ACCESS_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser')
+
+
+def _access(instance):
+    # Read through __dict__ so deferred fields aren't loaded
+    return tuple(instance.__dict__.get(field) for field in ACCESS_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._loaded_access = _access(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Drop the cached user, covering password and 'is_active' changes,
+       and revoke the access tokens when the user's access changed"""
+    invalidate_on_commit(user_cache.invalidate_user, instance.pk)
+
+    access = _access(instance)
+    if not created and access != instance._loaded_access:
+        revoke_access_tokens(instance.pk)
+        instance.token_version += 1
+    instance._loaded_access = access
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_on_commit(user_cache.invalidate_user, instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Logging out or deleting the refresh token revokes access tokens"""
+    invalidate_on_commit(user_cache.invalidate_token, instance.key)
+    revoke_access_tokens(instance.user_id)
+
+
+@receiver(user_logged_out)
+def user_logged_out_(sender, request, user, **kwargs):
+    if user is not None:
+        user_cache.invalidate_user(user.pk)
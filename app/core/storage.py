@@ -0,0 +1,111 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from core.models import StoredFile
+
+# '<dir>/ab/cd/abcd...(64 hex digits).<ext>'
+CONTENT_NAME_RE = re.compile(
+    r'(^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/'
+    r'(?P=a)(?P=b)[0-9a-f]{60}(\.[^/.]+)?$'
+)
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_NAME_RE.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by the SHA-256 of their content.
+
+       Files go to '<upload dir>/<2 hex>/<2 hex>/<sha256>.<ext>', so no
+       directory grows past a few thousand entries. Saving identical content
+       again reuses the stored file and increments its reference count, and
+       delete() only removes the file when the last reference goes away.
+       Names saved before this storage was enabled keep working."""
+
+    # Uploads are streamed here first, on the same file system as the target
+    incoming_dir = '.incoming'
+
+    def content_name(self, name, digest):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        )
+
+    def _save(self, name, content):
+        incoming = self.path(self.incoming_dir)
+        os.makedirs(incoming, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, partial = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+
+            name = self.content_name(name, digest.hexdigest())
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(partial, self.file_permissions_mode)
+            with transaction.atomic():
+                # Holding the reference row keeps a concurrent delete of
+                # the same content from removing the file under us
+                self.add_references(name, size)
+                os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content and may exist already
+        return name
+
+    def add_references(self, name, size, count=1):
+        """Count 'count' more references to the stored file"""
+        updated = StoredFile.objects.filter(name=name).update(
+            refs=F('refs') + count
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, size=size, refs=count)
+        except IntegrityError:
+            # Created concurrently by another upload of the same content
+            StoredFile.objects.filter(name=name).update(
+                refs=F('refs') + count
+            )
+
+    def delete(self, name):
+        """Drop one reference and remove the file with the last one"""
+        if not is_content_addressed(name):
+            return super().delete(name)
+
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is not None and stored.refs > 1:
+                stored.refs -= 1
+                stored.save(update_fields=['refs'])
+                return
+            if stored is not None:
+                stored.delete()
+            super().delete(name)
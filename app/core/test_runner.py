@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class PrimaryOnlyTestRunner(DiscoverRunner):
+    """Runs the tests against the primary database only, whatever
+       DB_REPLICA_HOSTS holds. The replicas mirror the test database, and
+       tests only reading from one would fail their database isolation
+       checks. Tests opt in with override_settings(DATABASE_REPLICAS=...)
+       and list the alias in their 'databases'."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.DATABASE_REPLICAS = []
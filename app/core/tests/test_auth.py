@@ -0,0 +1,210 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+
+from core.api.authentication import CachedTokenAuthentication
+from core.auth import LRUCache, user_cache
+
+RECIPE_LIST_URL = reverse('recipe:recipe_list')
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        """Test that a full cache drops the entry unused the longest"""
+        lru = LRUCache(max_size=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_entries_expire(self):
+        """Test that entries are gone after the timeout"""
+        lru = LRUCache(max_size=2, timeout=5)
+        with mock.patch('core.auth.time.monotonic', return_value=100):
+            lru.set('a', 1)
+        with mock.patch('core.auth.time.monotonic', return_value=104):
+            self.assertEqual(lru.get('a'), 1)
+        with mock.patch('core.auth.time.monotonic', return_value=106):
+            self.assertIsNone(lru.get('a'))
+
+
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+
+    def test_password_hash_not_cached(self):
+        """Test that the shared cache doesn't hold the password hash"""
+        user_cache.set_user(self.user)
+
+        data = cache.get(user_cache._user_key(self.user.pk))
+        self.assertNotIn('password', data)
+        self.assertNotIn(self.user.password, data.values())
+
+    def test_cached_user_saved_without_password(self):
+        """Test that saving a cached user keeps its password"""
+        user_cache.set_user(self.user)
+        user = user_cache.get_user(self.user.pk)
+        user.first_name = 'Changed'
+        user.save()
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Changed')
+        self.assertTrue(user.check_password('testpass1'))
+
+
+class UserCacheCommitTests(TransactionTestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+
+    def test_user_invalidated_on_commit(self):
+        """Test that a user cached before the change committed is dropped"""
+        stale = get_user_model().objects.get(pk=self.user.pk)
+        with transaction.atomic():
+            self.user.is_active = False
+            self.user.save()
+            # A concurrent request still reads the committed row
+            user_cache.set_user(stale)
+
+        self.assertIsNone(user_cache.get_user(self.user.pk))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_cached_token_needs_no_query(self):
+        """Test that a known token resolves its user without queries"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, key = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(key, self.token.key)
+
+    def test_shared_cache_fills_local_cache(self):
+        """Test that another process finds the user in the shared cache"""
+        self.auth.authenticate_credentials(self.token.key)
+        user_cache.local.clear()
+
+        with self.assertNumQueries(0):
+            user, key = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+
+    def test_cached_user_is_a_copy(self):
+        """Test that requests don't share the cached user instance"""
+        user, key = self.auth.authenticate_credentials(self.token.key)
+        user.first_name = 'Changed'
+
+        user, key = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user.first_name, '')
+
+    def test_deleted_token_rejected(self):
+        """Test that deleting the token invalidates the cached entry"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_rejected(self):
+        """Test that deactivating the user invalidates the cached entry"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_logout_deletes_token(self):
+        """Test that logging out through the API rejects the token"""
+        logout_url = reverse('rest_logout')
+        self.client.post(logout_url,
+                         HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+
+class CachedAuthenticationMiddlewareTests(TestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+        self.client.force_login(self.user)
+
+    def test_session_user_cached(self):
+        """Test that the session user is loaded once"""
+        self.client.get(RECIPE_LIST_URL)
+
+        with mock.patch.object(
+            get_user_model()._default_manager, 'filter'
+        ) as user_filter:
+            response = self.client.get(RECIPE_LIST_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user_filter.assert_not_called()
+
+    def test_password_change_ends_sessions(self):
+        """Test that other sessions are signed out by a password change"""
+        self.client.get(RECIPE_LIST_URL)
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        response = self.client.get(RECIPE_LIST_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_deactivated_user_signed_out(self):
+        """Test that a deactivated user is no longer authenticated"""
+        self.client.get(RECIPE_LIST_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(RECIPE_LIST_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_logout_drops_cached_user(self):
+        """Test that logging out removes the cached user"""
+        self.client.get(RECIPE_LIST_URL)
+
+        self.client.post(reverse('account_logout'))
+
+        self.assertIsNone(user_cache.get_user(self.user.pk))
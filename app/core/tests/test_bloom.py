@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from core.bloom import BloomFilter
+
+
+class BloomFilterTests(SimpleTestCase):
+
+    def test_added_items_are_found(self):
+        """Test that every added item is reported as present"""
+        bloom = BloomFilter(1000)
+        items = [f'uploads/recipe/{i}' for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        """Test that few missing items are reported as present"""
+        bloom = BloomFilter(1000, false_positive_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'present {i}')
+
+        false_positives = sum(f'missing {i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
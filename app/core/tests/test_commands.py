@@ -1,9 +1,19 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import ImportCheckpoint
+from recipe.models import Ingredient, Recipe, Tag
+from recipe.search import search_recipes
+
 
 class CommandTests(TestCase):
 
@@ -21,3 +31,124 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_import_recipes_csv(self):
+        """Test importing recipes with new and existing tags from CSV"""
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        path = self.write_file('recipes.csv', (
+            'title,time_minutes,price,tags,ingredients\n'
+            'Lentil soup,30,5.50,Vegan;Winter,Lentils;Carrot\n'
+            'Carrot cake,60,8.00,Winter,Carrot\n'
+            'Broken,abc,1.00,,\n'
+        ))
+
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, user=self.user.email,
+                     batch_size=2, stdout=out, stderr=err)
+
+        self.assertIn('Imported 2 recipes', out.getvalue())
+        self.assertIn('skipped 1 rows', out.getvalue())
+        self.assertIn('Row 3', err.getvalue())
+        soup = Recipe.objects.get(title='Lentil soup')
+        self.assertEqual(soup.user, self.user)
+        self.assertEqual(soup.link, '')
+        self.assertEqual(
+            sorted(t.name for t in soup.tags.all()), ['Vegan', 'Winter']
+        )
+        self.assertIn(existing, soup.tags.all())
+        self.assertEqual(Tag.objects.filter(name='Winter').count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name='Carrot').count(), 1)
+        found = search_recipes(Recipe.objects.all(), 'winter')
+        self.assertEqual(found.count(), 2)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+        recipe = Recipe.objects.create(
+            user=self.user, title='After import', time_minutes=1, price=1
+        )
+        self.assertGreater(recipe.id, soup.id)
+
+    def test_import_recipes_jsonl_per_row_user(self):
+        """Test importing JSON lines owned by the user of each row"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        path = self.write_file('recipes.jsonl', '\n'.join(
+            json.dumps(row) for row in [
+                {'user': self.user.email, 'title': 'Porridge',
+                 'time_minutes': 5, 'price': 2, 'tags': ['Breakfast']},
+                {'user': user2.email, 'title': 'Pancakes',
+                 'time_minutes': 15, 'price': 4, 'tags': ['Breakfast']},
+            ]
+        ))
+
+        call_command('import_recipes', path, stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.filter(user=user2).count(), 1)
+        self.assertEqual(Tag.objects.filter(name='Breakfast').count(), 2)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.tags.get().user, recipe.user)
+
+    def test_import_recipes_resumes_from_checkpoint(self):
+        """Test that an interrupted import skips the loaded rows"""
+        path = self.write_file('recipes.csv', (
+            'title,time_minutes,price\n'
+            'First,1,1.00\n'
+            'Second,2,2.00\n'
+            'Third,3,3.00\n'
+        ))
+        ImportCheckpoint.objects.create(name=path, rows=2)
+
+        out = StringIO()
+        call_command('import_recipes', path, user=self.user.email,
+                     stdout=out)
+
+        self.assertIn('Resuming after row 2', out.getvalue())
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)), ['Third']
+        )
+
+    def test_import_recipes_checkpoint_follows_commits(self):
+        """Test that a failed batch rolls back with its checkpoint"""
+        path = self.write_file('recipes.csv', (
+            'title,time_minutes,price\n'
+            'First,1,1.00\n'
+            'Second,2,2.00\n'
+        ))
+
+        with patch(
+            'core.management.commands.import_recipes.update_search_vectors',
+            side_effect=[None, OperationalError],
+        ):
+            with self.assertRaises(OperationalError):
+                call_command('import_recipes', path, user=self.user.email,
+                             batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)), ['First']
+        )
+        self.assertEqual(ImportCheckpoint.objects.get(name=path).rows, 1)
+
+    def test_import_recipes_missing_file(self):
+        """Test that a missing file fails the command"""
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', '/does/not/exist.csv')
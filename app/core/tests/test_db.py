@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.base import pool_metrics, reset_pool_metrics
+
+DB_POOL_URL = reverse('db_pool')
+
+
+def query():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        return cursor.fetchone()[0]
+
+
+class HealthCheckedConnectionTests(TransactionTestCase):
+
+    def setUp(self):
+        query()
+        reset_pool_metrics()
+
+    def test_reused_connection_counted(self):
+        """Test that a kept connection is checked and reused"""
+        raw = connection.connection
+        connection.close_if_unusable_or_obsolete()
+
+        self.assertEqual(query(), 1)
+        self.assertIs(connection.connection, raw)
+        self.assertEqual(pool_metrics()['reused'], 1)
+
+    def test_dropped_connection_replaced(self):
+        """Test that a connection dropped while idle is replaced before
+           the request uses it"""
+        connection.connection.close()
+        connection.close_if_unusable_or_obsolete()
+
+        self.assertEqual(query(), 1)
+        metrics = pool_metrics()
+        self.assertEqual(metrics['discarded'], 1)
+        self.assertEqual(metrics['opened'], 1)
+
+    def test_checked_once_per_request(self):
+        """Test that only the first query of a request checks"""
+        connection.close_if_unusable_or_obsolete()
+        query()
+        query()
+
+        self.assertEqual(pool_metrics()['reused'], 1)
+
+
+class DatabasePoolViewTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_pool_metrics_for_staff(self):
+        """Test that staff can read the connection counters"""
+        staff = get_user_model().objects.create_staffuser(
+            'staff@domain.com',
+            'testpass1'
+        )
+        self.client.force_authenticate(staff)
+
+        res = self.client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data['connections']),
+                         {'opened', 'reused', 'discarded', 'failed'})
+
+    def test_pool_metrics_not_for_users(self):
+        """Test that other users can't read the connection counters"""
+        user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.paginator import EstimatedCountPaginator
+from recipe.models import Tag
+
+
+def count_queries(captured_queries):
+    """Return the number of COUNT queries that were executed"""
+    return len([q for q in captured_queries if 'COUNT(' in q['sql']])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass123'
+        )
+        for i in range(12):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+    @override_settings(PAGINATOR_ESTIMATE_THRESHOLD=5)
+    def test_estimate_used_above_threshold(self):
+        """Test that large unfiltered tables use the planner estimate"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipe_tag')
+        paginator = EstimatedCountPaginator(Tag.objects.all(), 5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            count = paginator.count
+
+        self.assertEqual(count, 12)
+        self.assertEqual(count_queries(ctx.captured_queries), 0)
+
+    def test_exact_count_is_cached(self):
+        """Test that the exact count runs only once per queryset"""
+        queryset = Tag.objects.filter(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            first = EstimatedCountPaginator(queryset, 5).count
+            second = EstimatedCountPaginator(queryset, 5).count
+
+        self.assertEqual(first, 12)
+        self.assertEqual(second, 12)
+        self.assertEqual(count_queries(ctx.captured_queries), 1)
+
+    def test_page_window(self):
+        """Test the page range window around the current page"""
+        paginator = EstimatedCountPaginator(list(range(100)), 5)
+
+        self.assertEqual(paginator.page_window(1), range(1, 6))
+        self.assertEqual(paginator.page_window(10), range(5, 15))
+        self.assertEqual(paginator.page_window(20), range(15, 21))
+
+    def test_list_view_paginates_once(self):
+        """Test that a list page runs a single COUNT and a single slice"""
+        client = Client()
+        client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.get(reverse('recipe:tag_list'), {'page': 2})
+
+        tag_selects = [q for q in ctx.captured_queries
+                       if q['sql'].startswith('SELECT "recipe_tag"."id"')]
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context['list_objects'].number, 2)
+        self.assertEqual(list(res.context['page_range']), [1, 2, 3])
+        self.assertEqual(count_queries(ctx.captured_queries), 1)
+        self.assertEqual(len(tag_selects), 1)
+
+    def test_list_view_out_of_range_page(self):
+        """Test that an out of range page falls back to the last page"""
+        client = Client()
+        client.force_login(self.user)
+
+        res = client.get(reverse('recipe:tag_list'), {'page': 99})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context['list_objects'].number, 3)
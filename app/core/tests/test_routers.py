@@ -0,0 +1,235 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DataError, OperationalError, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.checks import check_replica_pin
+from core.db import routers
+from recipe.api.view_sets import RecipeViewSet
+from recipe.inverted_index import clear_indexes
+from recipe.models import Recipe, Tag
+
+REPLICA = 'replica'
+RECIPES_URL = reverse('recipe.api:recipe-list')
+
+
+class ReplicaAliasMixin:
+    """Registers the stand-in replica, a second connection to the test
+       database"""
+
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = dict(connections['default']
+                                              .settings_dict)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(ReplicaAliasMixin, TestCase):
+    """The stand-in replica can't see the uncommitted rows of the test
+       transaction, much like a replica which hasn't caught up yet."""
+
+    def setUp(self):
+        cache.clear()
+        routers._down_until.clear()
+        routers._lag_checked_at.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Soup',
+                              time_minutes=5, price=1)
+        # The writes above pinned the user
+        cache.clear()
+
+    def test_reads_go_to_replica(self):
+        """Test that safe requests read from the replica"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_reads_pinned_after_write(self):
+        """Test that a user reads their own writes from the primary"""
+        payload = {'title': 'Cake', 'time_minutes': 30, 'price': 5}
+        self.client.post(RECIPES_URL, payload)
+
+        res = self.client.get(RECIPES_URL)
+
+        titles = {recipe['title'] for recipe in res.data['results']}
+        self.assertEqual(titles, {'Soup', 'Cake'})
+
+    def test_pin_expires(self):
+        """Test that reads return to the replica once the pin expired"""
+        routers.pin_to_primary(self.user.id)
+        self.assertTrue(routers.is_pinned(self.user.id))
+
+        cache.delete(routers._pin_key(self.user.id))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        """Test that reads go to the primary when the replica is down"""
+        with mock.patch.object(connections[REPLICA], 'ensure_connection',
+                               side_effect=OperationalError('down')):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertFalse(routers.replica_available(REPLICA))
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """Test that replicas too far behind aren't used"""
+        with mock.patch.object(routers, 'replica_lag', return_value=60):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_failing_replica_request_served_by_primary(self):
+        """Test that a replica failing mid request is retried on the
+           primary and left out afterwards"""
+        get_queryset = RecipeViewSet.get_queryset
+        aliases = []
+
+        def failing_on_replica(view):
+            aliases.append(routers.read_alias())
+            if routers.read_alias() == REPLICA:
+                raise OperationalError('connection lost')
+            return get_queryset(view)
+
+        with mock.patch.object(RecipeViewSet, 'get_queryset',
+                               failing_on_replica):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(aliases, [REPLICA, None])
+        self.assertIsNone(routers.read_alias())
+        self.assertFalse(routers.replica_available(REPLICA))
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA, 'default'])
+    def test_failing_replica_retried_on_primary_only(self):
+        """Test that the retry doesn't pick another replica"""
+        get_queryset = RecipeViewSet.get_queryset
+        aliases = []
+
+        def failing_on_replica(view):
+            aliases.append(routers.read_alias())
+            if len(aliases) == 1:
+                raise OperationalError('connection lost')
+            return get_queryset(view)
+
+        with mock.patch.object(RecipeViewSet, 'get_queryset',
+                               failing_on_replica):
+            self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(aliases), 2)
+        self.assertIsNone(aliases[1])
+
+    def test_query_error_not_retried(self):
+        """Test that errors other than lost connections aren't retried
+           and leave the replica in rotation"""
+        def failing(view):
+            raise DataError('invalid input')
+
+        with mock.patch.object(RecipeViewSet, 'get_queryset', failing):
+            with self.assertRaises(DataError):
+                self.client.get(RECIPES_URL)
+
+        self.assertTrue(routers.replica_available(REPLICA))
+
+    def test_replica_reads_not_cached(self):
+        """Test that responses read from the replica don't fill the
+           response cache or get an ETag"""
+        res = self.client.get(RECIPES_URL)
+        self.assertNotIn('ETag', res)
+
+        with mock.patch.object(routers, 'replica_available',
+                               return_value=False):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIn('ETag', res)
+
+    def test_writes_go_to_primary(self):
+        """Test that instances read from the replica save to the primary"""
+        router = routers.ReplicaRouter()
+        routers.use_replica()
+        try:
+            self.assertEqual(router.db_for_read(Recipe), REPLICA)
+            self.assertEqual(router.db_for_write(Recipe), 'default')
+        finally:
+            routers.use_primary()
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaIndexTests(ReplicaAliasMixin, TransactionTestCase):
+    """Test the recipe inverted index on requests read from the replica"""
+
+    def setUp(self):
+        cache.clear()
+        clear_indexes()
+        routers._down_until.clear()
+        routers._lag_checked_at.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=1)
+        recipe.tags.add(self.tag)
+        Recipe.objects.create(user=self.user, title='Steak',
+                              time_minutes=5, price=1)
+        # The writes above pinned the user
+        cache.clear()
+
+    def test_replica_read_reuses_index(self):
+        """Test that filtering by tags on the replica builds the index on
+           the primary once, then serves it from memory"""
+        res = self.client.get(RECIPES_URL, {'tags': self.tag.id})
+        self.assertEqual([r['title'] for r in res.data['results']], ['Soup'])
+
+        # The count and the page, without rebuilding the index
+        with self.assertNumQueries(2, using=REPLICA), \
+                self.assertNumQueries(0, using='default'):
+            res = self.client.get(RECIPES_URL, {'tags': self.tag.id})
+
+        self.assertEqual([r['title'] for r in res.data['results']], ['Soup'])
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DATABASE_REPLICA_MAX_LAG=5)
+class ReplicaPinCheckTests(SimpleTestCase):
+
+    @override_settings(DATABASE_REPLICA_PIN_SECONDS=10)
+    def test_pin_within_lag_window_rejected(self):
+        """Test that pins ending before a lagging replica is noticed fail
+           the check"""
+        errors = check_replica_pin(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(DATABASE_REPLICA_PIN_SECONDS=15)
+    def test_pin_past_lag_window_accepted(self):
+        """Test that pins outlasting the lag window pass the check"""
+        self.assertEqual(check_replica_pin(None), [])
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage, is_content_addressed
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_names_file_by_content(self):
+        """Test that files are stored under sharded content hashes"""
+        name = self.storage.save('uploads/recipe/photo.JPG',
+                                 ContentFile(b'image data'))
+
+        digest = hashlib.sha256(b'image data').hexdigest()
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(
+            name, f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'image data')
+        incoming = self.storage.path(self.storage.incoming_dir)
+        self.assertEqual(os.listdir(incoming), [])
+
+    def test_identical_content_is_shared(self):
+        """Test that identical uploads share one reference counted file"""
+        first = self.storage.save('uploads/recipe/a.jpg',
+                                  ContentFile(b'same'))
+        second = self.storage.save('uploads/recipe/b.jpg',
+                                   ContentFile(b'same'))
+        other = self.storage.save('uploads/recipe/c.jpg',
+                                  ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 2)
+
+        self.storage.delete(first)
+        self.assertTrue(self.storage.exists(first))
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 1)
+
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertFalse(StoredFile.objects.filter(name=first).exists())
+
+    def test_previous_names_keep_working(self):
+        """Test that files named before remain readable and deletable"""
+        name = 'uploads/recipe/0b6c1a7e-old.jpg'
+        os.makedirs(os.path.dirname(self.storage.path(name)))
+        with open(self.storage.path(name), 'wb') as f:
+            f.write(b'legacy')
+
+        self.assertFalse(is_content_addressed(name))
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'legacy')
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
@@ -0,0 +1,168 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.api.tokens import issue_access_token, revoke_access_tokens, \
+    verify_access_token
+from core.auth import user_cache
+
+LOGIN_URL = reverse('rest_login')
+REFRESH_URL = reverse('token_refresh')
+RECIPES_URL = reverse('recipe.api:recipe-list')
+
+
+class AccessTokenTests(TestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+
+    def bearer(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_verify_access_token(self):
+        """Test that issued tokens verify and altered ones don't"""
+        token, expires = issue_access_token(self.user)
+
+        self.assertEqual(verify_access_token(token),
+                         (self.user.pk, self.user.token_version))
+        payload, signature = token.rsplit('.', 1)
+        user_id, rest = payload.split('.', 1)
+        forged = f'{int(user_id) + 1}.{rest}.{signature}'
+        self.assertIsNone(verify_access_token(forged))
+        self.assertIsNone(verify_access_token('not a token'))
+
+    def test_expired_access_token_rejected(self):
+        """Test that tokens stop verifying after their lifetime"""
+        token, expires = issue_access_token(self.user, lifetime=60)
+
+        with mock.patch('core.api.tokens.time.time',
+                        return_value=expires + 1):
+            self.assertIsNone(verify_access_token(token))
+
+    def test_api_accepts_access_token(self):
+        """Test that the API authenticates bearer access tokens"""
+        token, expires = issue_access_token(self.user)
+        self.bearer(token)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_api_rejects_revoked_access_token(self):
+        """Test that bumping the token version revokes access tokens"""
+        token, expires = issue_access_token(self.user)
+        self.bearer(token)
+        self.client.get(RECIPES_URL)
+
+        revoke_access_tokens(self.user.pk)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_access_tokens(self):
+        """Test that changing the password revokes access tokens"""
+        token, expires = issue_access_token(self.user)
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        self.bearer(token)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        new_token, expires = issue_access_token(self.user)
+        self.bearer(new_token)
+        self.assertEqual(self.client.get(RECIPES_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_unrelated_change_keeps_access_tokens(self):
+        """Test that profile changes don't revoke access tokens"""
+        token, expires = issue_access_token(self.user)
+        self.user.first_name = 'Changed'
+        self.user.save()
+
+        self.bearer(token)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleting_api_token_revokes_access_tokens(self):
+        """Test that deleting the refresh token revokes access tokens"""
+        api_token = Token.objects.create(user=self.user)
+        token, expires = issue_access_token(self.user)
+        api_token.delete()
+
+        self.bearer(token)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_returns_both_tokens(self):
+        """Test that logging in returns the API and access tokens"""
+        res = self.client.post(LOGIN_URL, {
+            'email': 'test@domain.com',
+            'password': 'testpass1',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['key'],
+                         Token.objects.get(user=self.user).key)
+        self.assertEqual(verify_access_token(res.data['access_token']),
+                         (self.user.pk, 0))
+        self.assertIn('access_token_expires', res.data)
+
+    def test_refresh_access_token(self):
+        """Test exchanging the API token for a new access token"""
+        api_token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {api_token.key}')
+
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(verify_access_token(res.data['access_token']),
+                         (self.user.pk, 0))
+
+    def test_refresh_rejects_access_token(self):
+        """Test that access tokens can't refresh themselves"""
+        token, expires = issue_access_token(self.user)
+        self.bearer(token)
+
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AccessTokenCommitTests(TransactionTestCase):
+
+    def setUp(self):
+        user_cache.local.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+
+    def test_revoked_user_invalidated_on_commit(self):
+        """Test that a user cached before the revocation committed is
+           dropped, so the old token version isn't kept"""
+        stale = get_user_model().objects.get(pk=self.user.pk)
+        with transaction.atomic():
+            revoke_access_tokens(self.user.pk)
+            # A concurrent request still reads the committed row
+            user_cache.set_user(stale)
+
+        self.assertIsNone(user_cache.get_user(self.user.pk))
+        self.assertEqual(user_cache.load_user(self.user.pk).token_version,
+                         stale.token_version + 1)
@@ -1,9 +1,10 @@
 from django.urls import reverse_lazy
 from django.views import generic
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.contrib.auth import get_user_model
 
 from .forms import CustomUserCreationForm
+from .paginator import EstimatedCountPaginator
 
 User = get_user_model()
 
@@ -23,23 +24,26 @@ class PaginatedListView(generic.ListView):
 
     # Default
     paginate_by = 5
+    paginator_class = EstimatedCountPaginator
 
     def get_context_data(self, *, object_list=None, **kwargs):
-        queryset = self.queryset
-        objects, page_range = self.initialize_paginator(queryset)
-
         # Context Update
         context = super(PaginatedListView, self).get_context_data(**kwargs)
+        objects = context['page_obj']
         context.update({
             'list_objects': objects,
-            'page_range': page_range,
+            'page_range': context['paginator'].page_window(objects.number),
         })
 
         return context
 
-    def initialize_paginator(self, queryset):
-        paginator = Paginator(queryset, self.paginate_by)
-        page = self.request.GET.get('page')
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate the queryset once, falling back to the first page on
+           an invalid number and to the last page when it is out of range"""
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty())
+        page = self.request.GET.get(self.page_kwarg)
 
         try:
             objects = paginator.page(page)
@@ -49,11 +53,6 @@ class PaginatedListView(generic.ListView):
             objects = paginator.page(1)
         except EmptyPage:
             objects = paginator.page(paginator.num_pages)
-        index = objects.number - 1
-
-        max_index = len(paginator.page_range)
-        start_index = index - 5 if index >= 5 else 0
-        end_index = index + 5 if index <= max_index - 5 else max_index
-        page_range = paginator.page_range[start_index:end_index]
 
-        return objects, page_range
+        is_paginated = objects.has_other_pages()
+        return paginator, objects, objects.object_list, is_paginated
@@ -0,0 +1,131 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, MANY_RELATION_KWARGS
+
+
+class UserOwnedManyRelatedField(serializers.ManyRelatedField):
+    """Many related field for objects owned by the request user.
+
+       Reads the related primary keys from an '<singular>_ids' annotation
+       when the queryset provides one and validates written primary keys
+       with a single 'IN' query."""
+
+    def __init__(self, ids_attr=None, **kwargs):
+        self.ids_attr = ids_attr
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        ids = getattr(instance, self.ids_attr, None)
+        if ids is None:
+            return super().get_attribute(instance)
+
+        return [PKOnlyObject(pk=pk) for pk in ids]
+
+    @property
+    def pk_field(self):
+        return self.child_relation.get_queryset().model._meta.pk
+
+    def _batch_pks(self, items):
+        """Return every valid primary key this field receives in a batch"""
+        pk_field = self.pk_field
+        pks = set()
+        for item in items:
+            values = item.get(self.field_name) if hasattr(item, 'get') \
+                else None
+            if isinstance(values, str) or not hasattr(values, '__iter__'):
+                continue
+            for value in values:
+                try:
+                    pks.add(pk_field.to_python(value))
+                except DjangoValidationError:
+                    pass
+
+        return pks
+
+    def resolve(self, pks):
+        """Return the user's objects for 'pks' keyed by primary key.
+           Items validated together in a list share one query per field."""
+        queryset = self.child_relation.get_queryset()
+        root = self.root
+        if not isinstance(root, serializers.ListSerializer):
+            return queryset.in_bulk(pks)
+
+        resolved = root.__dict__.setdefault('_resolved_related', {})
+        if self.field_name not in resolved:
+            resolved[self.field_name] = queryset.in_bulk(
+                self._batch_pks(root.initial_data)
+            )
+
+        return resolved[self.field_name]
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pks = []
+        for item in data:
+            try:
+                pks.append(self.pk_field.to_python(item))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        pks = list(dict.fromkeys(pks))
+
+        objects = self.resolve(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            raise serializers.ValidationError([
+                child.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ], code='does_not_exist')
+
+        return [objects[pk] for pk in pks]
+
+
+class UserOwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key related field limited to the request user's objects"""
+
+    def __init__(self, ids_attr=None, **kwargs):
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None:
+            queryset = queryset.filter(user=request.user)
+
+        return queryset
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {
+            'child_relation': cls(*args, **kwargs),
+            'ids_attr': kwargs.get('ids_attr'),
+        }
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return UserOwnedManyRelatedField(**list_kwargs)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """The recipe image thumbnails by size and format, as absolute URLs
+       when the request is known"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image_variants')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        if request is None:
+            return value
+
+        return {
+            size: {fmt: request.build_absolute_uri(url)
+                   for fmt, url in formats.items()}
+            for size, formats in value.items()
+        }
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 
+from recipe.images import normalize_image
 from recipe.models import Tag, Ingredient, Recipe
+from recipe.api.fields import ImageVariantsField, \
+    UserOwnedPrimaryKeyRelatedField
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -23,23 +26,27 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer a Recipe"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserOwnedPrimaryKeyRelatedField(
         many=True,
-        queryset=Ingredient.objects.all()
+        queryset=Ingredient.objects.all(),
+        ids_attr='ingredient_ids',
     )
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedPrimaryKeyRelatedField(
         many=True,
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        ids_attr='tag_ids',
     )
 
+    thumbnails = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id', 'title', 'ingredients', 'tags', 'time_minutes',
-            'price', 'link'
+            'price', 'link', 'thumbnails', 'image_placeholder', 'image_color'
         )
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'image_placeholder', 'image_color')
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -50,8 +57,14 @@ class RecipeDetailSerializer(RecipeSerializer):
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to 'Recipe' model."""
+    thumbnails = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id',)
+        fields = ('id', 'image', 'thumbnails', 'image_placeholder',
+                  'image_color')
+        read_only_fields = ('id', 'image_placeholder', 'image_color')
+
+    def validate_image(self, value):
+        """Normalize the uploaded image before it is stored"""
+        return normalize_image(value)
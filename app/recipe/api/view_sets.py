@@ -1,73 +1,193 @@
+from django.db.models import Exists, OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.api.authentication import AccessTokenAuthentication, \
+    CachedTokenAuthentication
+from core.api.bulk import BulkModelMixin
+from core.api.cache import ConditionalListMixin, ConditionalDetailMixin, \
+    UserListCacheMixin
+from core.api.pagination import CursorOptInPagination, \
+    NameCursorOptInPagination
+from core.api.routing import ReplicaReadMixin
 from recipe.models import Tag, Ingredient, Recipe
 from recipe.api import serializers
+from recipe.export import EXPORTERS
+from recipe.images import queue_variants
+from recipe.inverted_index import drop_index, get_index
+from recipe.search import search_recipes, typeahead, update_search_vectors
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            ConditionalListMixin,
+                            UserListCacheMixin,
+                            BulkModelMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,
+                              AccessTokenAuthentication)
     permission_classes = (IsAuthenticated,)
+    pagination_class = NameCursorOptInPagination
+
+    # Name of the 'Recipe' m2m field pointing to this attribute
+    recipe_field = None
+
+    def _recipe_links(self):
+        """Return the m2m through rows linking the outer object to recipes"""
+        field = Recipe._meta.get_field(self.recipe_field)
+        return field.remote_field.through.objects.filter(
+            **{field.m2m_reverse_field_name(): OuterRef('pk')}
+        ).order_by()
+
+    def _int_param(self, name):
+        """Return the integer query parameter, 0 when it is missing"""
+        value = self.request.query_params.get(name, 0)
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: [_('A valid integer is required.')]})
 
     def get_queryset(self):
         """Return objects for the current authenticated user"""
-        assigned_only = int(self.request.query_params.get('assigned_only', 0))
-        queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-
-        return queryset.filter(
-            user=self.request.user
-            ).order_by('-name').distinct()
+        assigned_only = self._int_param('assigned_only')
+        min_recipes = self._int_param('min_recipes')
+        queryset = self.queryset.filter(user=self.request.user)
+
+        if min_recipes > 1:
+            # The semi-join stops as soon as the N-th link is found
+            queryset = queryset.annotate(
+                nth_recipe_link=Subquery(
+                    self._recipe_links().values('pk')[
+                        min_recipes - 1:min_recipes
+                    ]
+                )
+            ).filter(nth_recipe_link__isnull=False)
+        elif assigned_only or min_recipes == 1:
+            queryset = queryset.annotate(
+                assigned=Exists(self._recipe_links())
+            ).filter(assigned=True)
+
+        term = self._typeahead_term()
+        if term:
+            return typeahead(queryset, term)
+
+        return queryset.order_by('-name')
+
+    def _typeahead_term(self):
+        return self.request.query_params.get('q', '').strip()
+
+    def paginate_queryset(self, queryset):
+        """Typeahead suggestions are limited instead of paginated"""
+        if self._typeahead_term():
+            return None
+
+        return super().paginate_queryset(queryset)
 
     def perform_create(self, serializer):
         """Create a new recipe attribute"""
         serializer.save(user=self.request.user)
 
+    def perform_bulk_write(self, instances, created):
+        """Refresh the search vectors of recipes using renamed objects"""
+        super().perform_bulk_write(instances, created)
+        if not created:
+            field = Recipe._meta.get_field(self.recipe_field)
+            update_search_vectors(
+                field.remote_field.through.objects.filter(**{
+                    f'{field.m2m_reverse_field_name()}__in': instances
+                }).values_list('recipe_id', flat=True).distinct()
+            )
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database"""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_field = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database"""
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_field = 'ingredients'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin,
+                    ConditionalDetailMixin,
+                    UserListCacheMixin,
+                    BulkModelMixin,
+                    viewsets.ModelViewSet):
     """Manage recipes in the database"""
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,
+                              AccessTokenAuthentication)
     permission_classes = (IsAuthenticated,)
+    pagination_class = CursorOptInPagination
 
     def _params_to_ints(self, query_string):
         """Convert a list of string IDs to a list of integers"""
         return [int(str_id) for str_id in query_string.split(',')]
 
+    def _id_params(self, name):
+        """Return the integer ids of a comma separated query parameter"""
+        query_string = self.request.query_params.get(name)
+        if not query_string:
+            return []
+        try:
+            return self._params_to_ints(query_string)
+        except ValueError:
+            raise ValidationError({
+                name: [_('Expected a comma separated list of ids.')]
+            })
+
+    def _matching_recipe_ids(self):
+        """Resolve the tag and ingredient filters with the inverted index.
+           Returns None when the request has no such filter."""
+        index = None
+        recipe_ids = None
+        for field_name in ('tags', 'ingredients'):
+            all_of = self._id_params(f'{field_name}_all')
+            any_of = self._id_params(field_name)
+            none_of = self._id_params(f'{field_name}_none')
+            if not (all_of or any_of or none_of):
+                continue
+
+            index = index or get_index(self.request.user.id)
+            matches = index.match(field_name, all_of, any_of, none_of)
+            recipe_ids = matches if recipe_ids is None else (
+                recipe_ids & matches
+            )
+
+        return recipe_ids
+
     def get_queryset(self):
         """Retrieve the recipes for the authenticated user"""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
 
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        recipe_ids = self._matching_recipe_ids()
+        if recipe_ids is not None:
+            queryset = queryset.filter(id__in=recipe_ids)
 
-        return queryset.filter(user=self.request.user)
+        queryset = queryset.filter(user=self.request.user)
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_recipes(queryset, search)
+
+        if self.action == 'list':
+            return queryset.with_related_ids()
+        if self.action == 'retrieve':
+            return queryset.with_related_objects()
+
+        return queryset
 
     def get_serializer_class(self):
         """Retrieve appropriate serializer class"""
@@ -82,6 +202,31 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new Recipe"""
         serializer.save(user=self.request.user)
 
+    def perform_bulk_write(self, instances, created):
+        """Index the written recipes, bulk writes send no signals"""
+        super().perform_bulk_write(instances, created)
+        update_search_vectors(recipe.pk for recipe in instances)
+        # Dropped once the transaction commits
+        drop_index(self.request.user.id)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream every matching recipe as NDJSON, CSV or a zip archive
+           which includes the images. Choose with '?as=ndjson|csv|zip'."""
+        kind = request.query_params.get('as', 'ndjson')
+        if kind not in EXPORTERS:
+            return Response(
+                {'as': [f'"{kind}" is not one of {", ".join(EXPORTERS)}.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        exporter, content_type = EXPORTERS[kind]
+        response = StreamingHttpResponse(exporter(self.get_queryset()),
+                                         content_type=content_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{kind}"'
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
@@ -92,7 +237,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            queue_variants(serializer.save())
             return Response(
                 data=serializer.data,
                 status=status.HTTP_200_OK
@@ -0,0 +1,147 @@
+import csv
+import json
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_FIELDS = (
+    'id', 'title', 'time_minutes', 'price', 'link', 'image', 'tags',
+    'ingredients',
+)
+
+
+def export_rows(queryset):
+    """Yield the recipes of the queryset as plain dicts, reading them with
+       a server-side cursor"""
+    rows = queryset.with_related_names().values(
+        'id', 'title', 'time_minutes', 'price', 'link', 'image',
+        'tag_names', 'ingredient_names',
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+    for row in rows:
+        row['tags'] = row.pop('tag_names')
+        row['ingredients'] = row.pop('ingredient_names')
+        row['image'] = row['image'] or None
+        yield row
+
+
+def stream_ndjson(rows):
+    """Yield one JSON document per line"""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class Echo:
+    """File-like object returning what is written instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, separator=';'):
+    """Yield the rows as CSV lines, with tag and ingredient names joined
+       by 'separator'"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['tags'] = separator.join(row['tags'])
+        row['ingredients'] = separator.join(row['ingredients'])
+        yield writer.writerow([row[name] for name in EXPORT_FIELDS])
+
+
+class ZipStream:
+    """Unseekable file collecting what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _zip_info(name, compress_type=zipfile.ZIP_STORED):
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def archive_image_name(name):
+    """Return the path of an image in the zip archive"""
+    return f'images/{name}'
+
+
+def stream_zip(queryset, chunk_size=64 * 1024):
+    """Yield a zip archive holding 'recipes.ndjson' and the recipe images
+       under 'images/', which the 'image' of the records points to"""
+    return (
+        data for data in _stream_zip(queryset, chunk_size) if data
+    )
+
+
+def export_ndjson(queryset):
+    return stream_ndjson(export_rows(queryset))
+
+
+def export_csv(queryset):
+    return stream_csv(export_rows(queryset))
+
+
+# Export format => streaming function and content type
+EXPORTERS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+    'zip': (stream_zip, 'application/zip'),
+}
+
+
+def _archive_rows(queryset):
+    for row in export_rows(queryset):
+        if row['image']:
+            row['image'] = archive_image_name(row['image'])
+        yield row
+
+
+def _stream_zip(queryset, chunk_size):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        ndjson = _zip_info('recipes.ndjson', zipfile.ZIP_DEFLATED)
+        # The size isn't known up front and may pass the 2 GiB ZIP64 limit
+        with archive.open(ndjson, 'w', force_zip64=True) as f:
+            pending = 0
+            for line in stream_ndjson(_archive_rows(queryset)):
+                pending += f.write(line.encode())
+                if pending >= chunk_size:
+                    pending = 0
+                    yield stream.drain()
+        yield stream.drain()
+
+        images = queryset.exclude(image='').exclude(
+            image__isnull=True
+        ).values_list('image', flat=True).order_by().distinct().iterator(
+            chunk_size=settings.EXPORT_CHUNK_SIZE
+        )
+        for name in images:
+            if not default_storage.exists(name):
+                continue
+            # Images are compressed already, store them as they are
+            info = _zip_info(archive_image_name(name))
+            with default_storage.open(name) as source, \
+                    archive.open(info, 'w') as f:
+                for chunk in source.chunks(chunk_size):
+                    f.write(chunk)
+                    yield stream.drain()
+            yield stream.drain()
+
+    yield stream.drain()
@@ -6,6 +6,7 @@ from django.forms import (
     ModelForm,
 )
 
+from recipe.images import normalize_image
 from recipe.models import Recipe, Tag, Ingredient
 
 
@@ -25,3 +26,10 @@ class RecipeModelForm(ModelForm):
                   'ingredients',
                   'time_minutes',
                   'image']
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if image and 'image' in self.changed_data:
+            image = normalize_image(image)
+
+        return image
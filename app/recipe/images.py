@@ -0,0 +1,253 @@
+import base64
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.translation import gettext_lazy as _
+from PIL import Image, ImageOps, features
+
+from core.cache import bump_data_version
+
+# Variant format => (Pillow format, file extension)
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+# Pillow built without libwebp can't encode WEBP, and failing on it would
+# leave the other formats unrecorded too
+if not features.check('webp'):
+    del VARIANT_FORMATS['webp']
+
+# EXIF orientation => transposition making the image upright
+EXIF_ORIENTATION = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+
+
+def exif_orientation(image):
+    try:
+        exif = image._getexif() or {}
+    except (AttributeError, KeyError, IndexError, SyntaxError, ValueError):
+        # No EXIF support for the format, or unreadable EXIF data
+        return None
+
+    return exif.get(EXIF_ORIENTATION)
+
+
+def apply_exif_orientation(image, orientation):
+    """Return the image turned the way its EXIF orientation says"""
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    return image.transpose(method) if method is not None else image
+
+
+def normalize_image(upload):
+    """Return the upload as an upright image of at most
+       RECIPE_IMAGE_MAX_EDGE pixels on its longest edge without metadata.
+
+       The file size and the pixel count from the header are checked before
+       anything is decoded, so oversized and decompression bomb images are
+       rejected without being loaded into memory."""
+    if upload.size > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            _('The image file is too large, the maximum is %(max)s bytes.'),
+            code='file_too_large',
+            params={'max': settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE},
+        )
+
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (IOError, Image.DecompressionBombError):
+        raise ValidationError(_('Upload a valid image.'),
+                              code='invalid_image')
+
+    width, height = image.size
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            _('The image has too many pixels, the maximum is %(max)s.'),
+            code='too_many_pixels',
+            params={'max': settings.RECIPE_IMAGE_MAX_PIXELS},
+        )
+
+    max_edge = settings.RECIPE_IMAGE_MAX_EDGE
+    orientation = exif_orientation(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    # JPEG decoders can scale down by 1/2, 1/4 or 1/8 while decoding
+    image.draft('RGB', (max_edge, max_edge))
+    try:
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (IOError, SyntaxError, ValueError):
+        raise ValidationError(_('Upload a valid image.'),
+                              code='invalid_image')
+    image = apply_exif_orientation(image, orientation)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    # The PNG encoder falls back to the metadata convert() copied over
+    image.info.pop('icc_profile', None)
+    image.info.pop('exif', None)
+    output = io.BytesIO()
+    if has_alpha:
+        image.save(output, 'PNG', optimize=True)
+        extension = 'png'
+    else:
+        image.save(output, 'JPEG', quality=settings.RECIPE_IMAGE_QUALITY,
+                   optimize=True, progressive=True)
+        extension = 'jpg'
+
+    stem = os.path.splitext(os.path.basename(upload.name))[0] or 'image'
+    return ContentFile(output.getvalue(), name=f'{stem}.{extension}')
+
+
+def variant_name(name, size, fmt):
+    """Return the storage name of a variant, next to the original image"""
+    stem = os.path.splitext(name)[0]
+    return f'{stem}.{size}.{VARIANT_FORMATS[fmt][1]}'
+
+
+def source_stem(name):
+    """Return the stem of the image a variant name was generated from, or
+       None when 'name' isn't a variant"""
+    stem, extension = os.path.splitext(name)
+    stem, size = os.path.splitext(stem)
+    extensions = {f'.{ext}' for pil_format, ext in VARIANT_FORMATS.values()}
+    if extension in extensions and size[1:].isdigit() and \
+            int(size[1:]) in settings.RECIPE_THUMBNAIL_SIZES:
+        return stem
+
+    return None
+
+
+def render_variants(path, sizes, quality):
+    """Write the square thumbnails of the image file at 'path' in every
+       variant format. Only uses Pillow so it can run in a worker process.
+       Returns the number of files written."""
+    written = 0
+    with Image.open(path) as original:
+        orientation = exif_orientation(original)
+        original = apply_exif_orientation(original.convert('RGB'),
+                                          orientation)
+        for size in sizes:
+            thumbnail = ImageOps.fit(original, (size, size), Image.LANCZOS)
+            for fmt, (pil_format, extension) in VARIANT_FORMATS.items():
+                target = variant_name(path, size, fmt)
+                # Write aside and rename so readers never see partial files
+                partial = f'{target}.part'
+                thumbnail.save(partial, pil_format, quality=quality)
+                os.replace(partial, target)
+                written += 1
+
+    return written
+
+
+def image_placeholder(source, size=16):
+    """Return a base64 data URI of a tiny preview of the image file or path
+       and its dominant color as '#rrggbb'. Only uses Pillow so it can run
+       in a worker process."""
+    with Image.open(source) as image:
+        orientation = exif_orientation(image)
+        image.draft('RGB', (size * 4, size * 4))
+        image = apply_exif_orientation(image.convert('RGB'), orientation)
+    image.thumbnail((size, size), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=40)
+    preview = base64.b64encode(output.getvalue()).decode()
+
+    palette = image.quantize(colors=4)
+    count, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+
+    return (f'data:image/jpeg;base64,{preview}',
+            f'#{red:02x}{green:02x}{blue:02x}')
+
+
+def get_executor():
+    """Return the process pool shared by the requests of this process"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_THUMBNAIL_WORKERS
+            )
+
+    return _executor
+
+
+def queue_variants(recipe):
+    """Generate the variants of the recipe image once the transaction
+       saving it committed. With no workers configured they are rendered
+       right away in the request."""
+    if not recipe.image:
+        return
+
+    args = (
+        default_storage.path(recipe.image.name),
+        settings.RECIPE_THUMBNAIL_SIZES,
+        settings.RECIPE_THUMBNAIL_QUALITY,
+    )
+    name, sizes = recipe.image.name, settings.RECIPE_THUMBNAIL_SIZES
+    if not settings.RECIPE_THUMBNAIL_WORKERS:
+        render_variants(*args)
+        record_variants(name, sizes)
+        recipe.image_sizes = list(sizes)
+        recipe.__dict__.pop('image_variants', None)
+        return
+
+    def done(future):
+        if future.exception() is not None:
+            logger.error('Rendering the variants of %s failed', name,
+                         exc_info=future.exception())
+            return
+        try:
+            record_variants(name, sizes)
+        finally:
+            # The callback runs in a thread of the pool, not of a request
+            connection.close()
+        # Cached responses listing the recipe lack the new variants
+        bump_data_version(recipe.user_id)
+
+    def submit():
+        get_executor().submit(render_variants, *args).add_done_callback(done)
+
+    transaction.on_commit(submit)
+
+
+def record_variants(name, sizes):
+    """Record the sizes rendered for the image on the recipes using it, so
+       their URLs are built without asking the storage"""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Recipe.objects.filter(image=name).update(image_sizes=list(sizes))
+
+
+def image_variants(name, sizes):
+    """Return the URLs of the variants of the image in the recorded sizes,
+       by size and format"""
+    return {
+        str(size): {
+            fmt: default_storage.url(variant_name(name, size, fmt))
+            for fmt in VARIANT_FORMATS
+        }
+        for size in sizes
+    }
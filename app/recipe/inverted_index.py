@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from recipe.models import Recipe
+
+_lock = threading.RLock()
+_indexes = OrderedDict()
+
+
+def _generation_key(user_id):
+    return f'recipe-index-generation:{user_id}'
+
+
+def get_generation(user_id):
+    """Return the shared generation of the user's recipe links"""
+    return cache.get(_generation_key(user_id), 0)
+
+
+def bump_generation(user_id):
+    """Advance the shared generation so other processes rebuild"""
+    key = _generation_key(user_id)
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(key, 1, None)
+        return 1
+
+
+class RecipeInvertedIndex:
+    """Maps the tag and ingredient ids of one user to sets of recipe ids.
+       Always built from the primary, which the generation follows."""
+
+    def __init__(self, user_id, generation):
+        self.user_id = user_id
+        self.generation = generation
+        self.built_on = time.monotonic()
+        self.recipes = set(
+            Recipe.objects.using(DEFAULT_DB_ALIAS).filter(
+                user_id=user_id
+            ).order_by().values_list('id', flat=True)
+        )
+        self.tags = self._load('tags')
+        self.ingredients = self._load('ingredients')
+
+    def _load(self, field_name):
+        field = Recipe._meta.get_field(field_name)
+        column = f'{field.m2m_reverse_field_name()}_id'
+        links = field.remote_field.through.objects.using(
+            DEFAULT_DB_ALIAS
+        ).filter(
+            recipe__user_id=self.user_id
+        ).order_by().values_list(column, 'recipe_id')
+
+        postings = {}
+        for attr_id, recipe_id in links.iterator():
+            postings.setdefault(attr_id, set()).add(recipe_id)
+
+        return postings
+
+    def postings(self, field_name):
+        """Return the postings of 'tags' or 'ingredients'"""
+        return getattr(self, field_name)
+
+    def match(self, field_name, all_of=(), any_of=(), none_of=()):
+        """Return the recipe ids which have every id in 'all_of', at least
+           one id in 'any_of' and no id in 'none_of'"""
+        postings = self.postings(field_name)
+        empty = frozenset()
+        result = self.recipes
+
+        for attr_id in all_of:
+            result = result & postings.get(attr_id, empty)
+        if any_of:
+            result = result & set().union(
+                *(postings.get(attr_id, empty) for attr_id in any_of)
+            )
+        for attr_id in none_of:
+            result = result - postings.get(attr_id, empty)
+
+        return result
+
+    def is_stale(self):
+        ttl = settings.RECIPE_INDEX_TTL
+        return time.monotonic() - self.built_on > ttl or (
+            self.generation != get_generation(self.user_id)
+        )
+
+
+def get_index(user_id):
+    """Return the up to date inverted index of the user"""
+    if transaction.get_connection().in_atomic_block:
+        # The transaction may see its own uncommitted links, such an index
+        # mustn't outlive the request
+        return RecipeInvertedIndex(user_id, get_generation(user_id))
+
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and not index.is_stale():
+            _indexes.move_to_end(user_id)
+            return index
+
+    index = RecipeInvertedIndex(user_id, get_generation(user_id))
+    with _lock:
+        _indexes[user_id] = index
+        while len(_indexes) > settings.RECIPE_INDEX_MAX_USERS:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+def update_index(user_id, apply):
+    """Bump the user's generation and apply the change in place when the
+       loaded index was current, otherwise drop it for a rebuild.
+
+       Both happen once the transaction commits, a rolled back change
+       leaves the loaded index as it was, matching the database."""
+    transaction.on_commit(lambda: _update_index(user_id, apply))
+
+
+def _update_index(user_id, apply):
+    with _lock:
+        index = _indexes.get(user_id)
+        generation = bump_generation(user_id)
+        if index is not None and index.generation == generation - 1:
+            apply(index)
+            index.generation = generation
+        else:
+            _indexes.pop(user_id, None)
+
+
+def clear_indexes():
+    """Drop every index loaded in this process"""
+    with _lock:
+        _indexes.clear()
+
+
+def drop_index(user_id):
+    """Bump the user's generation and drop the loaded index once the
+       transaction commits, for writes which bypass the model signals"""
+    transaction.on_commit(lambda: _drop_index(user_id))
+
+
+def _drop_index(user_id):
+    with _lock:
+        bump_generation(user_id)
+        _indexes.pop(user_id, None)
@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_data_version
+from recipe.images import image_placeholder
+from recipe.models import Recipe
+
+
+def _placeholder_or_none(path):
+    try:
+        return image_placeholder(path)
+    except (IOError, SyntaxError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to compute the placeholders of existing images"""
+
+    help = 'Compute the missing image placeholders of recipes in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=settings.RECIPE_THUMBNAIL_WORKERS or 1,
+            help='Number of worker processes decoding images',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of recipes updated per query',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).filter(image_placeholder='').only(
+            'id', 'user_id', 'image'
+        ).order_by('id').iterator()
+
+        updated = failed = 0
+        user_ids = set()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(islice(recipes, options['batch_size']))
+                if not batch:
+                    break
+
+                placeholders = pool.map(
+                    _placeholder_or_none,
+                    [default_storage.path(r.image.name) for r in batch],
+                )
+                changed = []
+                for recipe, placeholder in zip(batch, placeholders):
+                    if placeholder is None:
+                        failed += 1
+                        self.stderr.write(f'{recipe.image.name}: unreadable')
+                        continue
+                    recipe.image_placeholder, recipe.image_color = \
+                        placeholder
+                    changed.append(recipe)
+                    user_ids.add(recipe.user_id)
+
+                Recipe.objects.bulk_update(
+                    changed, ['image_placeholder', 'image_color']
+                )
+                updated += len(changed)
+                self.stdout.write(f'Computed {updated} placeholders...')
+
+        for user_id in user_ids:
+            bump_data_version(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed {updated} placeholders, {failed} images unreadable'
+        ))
@@ -0,0 +1,125 @@
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.bloom import BloomFilter
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+from recipe.images import VARIANT_FORMATS
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to delete media files no recipe refers to"""
+
+    help = 'Delete the files under MEDIA_ROOT which no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the files which would be deleted',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of files deleted at once',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Keep files modified less than this many seconds ago, '
+                 'they may belong to uploads still in progress',
+        )
+        parser.add_argument(
+            '--false-positive-rate', type=float, default=0.001,
+            help='Share of orphaned files which may be kept by mistake, '
+                 'lower values use more memory',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.root = settings.MEDIA_ROOT
+        extensions = '|'.join(
+            extension for pil_format, extension in VARIANT_FORMATS.values()
+        )
+        self.variant_re = re.compile(
+            rf'^(?P<stem>.+)\.(?P<size>\d+)\.({extensions})$'
+        )
+        # Taken before reading the references, so files saved while this
+        # runs are younger and survive
+        self.cutoff = time.time() - options['min_age']
+
+        referenced = self.referenced_stems(options['false_positive_rate'])
+
+        scanned = deleted = reclaimed = 0
+        batch = []
+        for path, entry in self.walk(self.root):
+            scanned += 1
+            if self.stem(path) in referenced:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > self.cutoff:
+                continue
+
+            deleted += 1
+            reclaimed += stat.st_size
+            if self.dry_run or options['verbosity'] > 1:
+                self.stdout.write(path)
+            batch.append(path)
+            if len(batch) >= options['batch_size']:
+                self.delete(batch)
+                batch = []
+        self.delete(batch)
+
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} of {scanned} files, '
+            f'reclaiming {reclaimed} bytes'
+        ))
+
+    def stem(self, name):
+        """Return the name shared by an image and its thumbnails"""
+        match = self.variant_re.match(name)
+        if match and int(match.group('size')) in \
+                settings.RECIPE_THUMBNAIL_SIZES:
+            return match.group('stem')
+
+        return os.path.splitext(name)[0]
+
+    def referenced_stems(self, false_positive_rate):
+        """Stream the image names out of the database into a Bloom filter"""
+        images = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        referenced = BloomFilter(images.count(), false_positive_rate)
+        for name in images.order_by().values_list(
+            'image', flat=True
+        ).iterator():
+            referenced.add(os.path.splitext(name)[0])
+
+        return referenced
+
+    def walk(self, directory, prefix=''):
+        """Yield the relative path and entry of every file below
+           'directory', without listing whole trees in memory"""
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Hidden files are not ours, but abandoned uploads are
+                if entry.name.startswith('.') and \
+                        entry.name != ContentAddressedStorage.incoming_dir:
+                    continue
+                path = f'{prefix}{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self.walk(entry.path, f'{path}/')
+                elif entry.is_file(follow_symlinks=False):
+                    yield path, entry
+
+    def delete(self, paths):
+        if self.dry_run or not paths:
+            return
+
+        for path in paths:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+        StoredFile.objects.filter(name__in=paths).delete()
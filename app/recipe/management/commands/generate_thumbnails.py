@@ -0,0 +1,93 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_data_version
+from recipe.images import VARIANT_FORMATS, record_variants, \
+    render_variants, variant_name
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to generate the thumbnails of existing images"""
+
+    help = 'Generate the missing thumbnails of recipe images in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=settings.RECIPE_THUMBNAIL_WORKERS or 1,
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of images queued to the workers at once',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate thumbnails which exist already',
+        )
+
+    def is_missing(self, name, sizes):
+        return any(
+            not default_storage.exists(variant_name(name, size, fmt))
+            for size in sizes for fmt in VARIANT_FORMATS
+        )
+
+    def pending(self, images, sizes, force, user_ids):
+        """Yield the images to render, recording the sizes of the ones
+           rendered before their sizes were recorded"""
+        for name, user_id in images:
+            if force or self.is_missing(name, sizes):
+                yield name, user_id
+            else:
+                record_variants(name, sizes)
+                user_ids.add(user_id)
+
+    def handle(self, *args, **options):
+        sizes = settings.RECIPE_THUMBNAIL_SIZES
+        images = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            images = images.exclude(image_sizes__contains=list(sizes))
+        user_ids = set()
+        pending = self.pending(
+            images.order_by().values_list('image', 'user_id').iterator(),
+            sizes, options['force'], user_ids,
+        )
+
+        generated = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(islice(pending, options['batch_size']))
+                if not batch:
+                    break
+
+                futures = {
+                    pool.submit(render_variants,
+                                default_storage.path(name),
+                                sizes, settings.RECIPE_THUMBNAIL_QUALITY):
+                    (name, user_id)
+                    for name, user_id in batch
+                }
+                for future in as_completed(futures):
+                    name, user_id = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'{name}: {e}')
+                    else:
+                        record_variants(name, sizes)
+                        generated += 1
+                        user_ids.add(user_id)
+                self.stdout.write(f'Generated {generated} thumbnails...')
+
+        for user_id in user_ids:
+            bump_data_version(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated thumbnails of {generated} images, {failed} failed'
+        ))
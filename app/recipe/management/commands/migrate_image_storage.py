@@ -0,0 +1,89 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import bump_data_version
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage, is_content_addressed
+from recipe.images import VARIANT_FORMATS, variant_name
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to move recipe images to content addressed names"""
+
+    help = ('Move recipe images to sharded content addressed names, sharing '
+            'identical files')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count the images which would be moved',
+        )
+
+    def handle(self, *args, **options):
+        storage = ContentAddressedStorage()
+        names = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).order_by().values_list('image', flat=True).distinct().iterator()
+
+        moved = shared = missing = saved = 0
+        for name in names:
+            if is_content_addressed(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f'{name}: file does not exist')
+                continue
+            if options['dry_run']:
+                moved += 1
+                continue
+
+            size = storage.size(name)
+            with transaction.atomic():
+                with storage.open(name) as f:
+                    new_name = storage.save(name, f)
+                recipes = Recipe.objects.filter(image=name)
+                user_ids = set(recipes.values_list('user_id', flat=True))
+                count = recipes.update(image=new_name)
+                if count > 1:
+                    storage.add_references(new_name, size, count - 1)
+                refs = StoredFile.objects.get(name=new_name).refs
+            # Cached responses still point at the old name
+            for user_id in user_ids:
+                bump_data_version(user_id)
+
+            if refs > count:
+                # The same content was stored under another name already
+                shared += 1
+                saved += size
+            self.move_variants(storage, name, new_name)
+            storage.delete(name)
+            moved += 1
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} images, {shared} were duplicates '
+            f'({saved} bytes saved), {missing} missing'
+        ))
+        if settings.DEFAULT_FILE_STORAGE != \
+                'core.storage.ContentAddressedStorage':
+            self.stdout.write(
+                'DEFAULT_FILE_STORAGE is not content addressed, new uploads '
+                'still use the previous naming.'
+            )
+
+    def move_variants(self, storage, name, new_name):
+        """Keep the generated thumbnails with the moved image"""
+        for size in settings.RECIPE_THUMBNAIL_SIZES:
+            for fmt in VARIANT_FORMATS:
+                old = storage.path(variant_name(name, size, fmt))
+                new = storage.path(variant_name(new_name, size, fmt))
+                if not os.path.exists(old):
+                    continue
+                if os.path.exists(new):
+                    os.remove(old)
+                else:
+                    os.replace(old, new)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from recipe.models import Recipe
+from recipe.search import update_search_vectors_between
+
+
+class Command(BaseCommand):
+    """Django command to recompute the search vectors of every recipe"""
+
+    help = 'Rebuild the full-text search vectors of all recipes in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of recipe ids updated per transaction',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Recipe.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No recipes to index.')
+            return
+
+        updated = 0
+        for first_id in range(bounds['first'], bounds['last'] + 1,
+                              batch_size):
+            with transaction.atomic():
+                updated += update_search_vectors_between(
+                    first_id, first_id + batch_size - 1
+                )
+            self.stdout.write(f'Indexed {updated} recipes...')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt search vectors of {updated} recipes')
+        )
@@ -0,0 +1,75 @@
+from django.db import migrations, models
+
+
+def create_index_concurrently(table, name, columns):
+    return (
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+        f'ON "{table}" ({columns});'
+    )
+
+
+def drop_index_concurrently(name):
+    return f'DROP INDEX CONCURRENTLY IF EXISTS "{name}";'
+
+
+def add_model_index(model_name, table, index, columns):
+    """Create a model index concurrently while keeping the migration
+       state in sync with the model Meta"""
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[
+            migrations.RunSQL(
+                sql=create_index_concurrently(table, index.name, columns),
+                reverse_sql=drop_index_concurrently(index.name),
+            ),
+        ],
+        state_operations=[
+            migrations.AddIndex(model_name=model_name, index=index),
+        ],
+    )
+
+
+def add_through_index(table, name, columns):
+    """Create an index on an auto created m2m through table"""
+    return migrations.RunSQL(
+        sql=create_index_concurrently(table, name, columns),
+        reverse_sql=drop_index_concurrently(name),
+    )
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('recipe', '0003_auto_20190714_1552'),
+    ]
+
+    operations = [
+        add_model_index(
+            'recipe', 'recipe_recipe',
+            models.Index(fields=['user', '-id'],
+                         name='recipe_user_id_desc_idx'),
+            '"user_id", "id" DESC',
+        ),
+        add_model_index(
+            'tag', 'recipe_tag',
+            models.Index(fields=['user', '-name'],
+                         name='tag_user_name_desc_idx'),
+            '"user_id", "name" DESC',
+        ),
+        add_model_index(
+            'ingredient', 'recipe_ingredient',
+            models.Index(fields=['user', '-name'],
+                         name='ingredient_user_name_desc_idx'),
+            '"user_id", "name" DESC',
+        ),
+        add_through_index(
+            'recipe_recipe_tags', 'recipe_tags_tag_recipe_idx',
+            '"tag_id", "recipe_id"',
+        ),
+        add_through_index(
+            'recipe_recipe_ingredients', 'recipe_ingredients_ingr_recipe_idx',
+            '"ingredient_id", "recipe_id"',
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def add_trigram_index(model_name, table, name):
+    """Create a trigram index on 'name' concurrently while keeping the
+       migration state in sync with the model Meta"""
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[
+            migrations.RunSQL(
+                sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+                    f'ON "{table}" USING gin '
+                    f'("name" gin_trgm_ops);',
+                reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS "{name}";',
+            ),
+        ],
+        state_operations=[
+            migrations.AddIndex(
+                model_name=model_name,
+                index=GinIndex(fields=['name'], name=name,
+                               opclasses=['gin_trgm_ops']),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('recipe', '0005_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        add_trigram_index('tag', 'recipe_tag', 'tag_name_trgm_idx'),
+        add_trigram_index('ingredient', 'recipe_ingredient',
+                          'ingredient_name_trgm_idx'),
+    ]
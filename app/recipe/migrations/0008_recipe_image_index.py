@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('recipe', '0007_recipe_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                        '"recipe_image_idx" ON "recipe_recipe" '
+                        '("image" varchar_pattern_ops);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                                '"recipe_image_idx";',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=models.Index(fields=['image'],
+                                       name='recipe_image_idx',
+                                       opclasses=['varchar_pattern_ops']),
+                ),
+            ],
+        ),
+    ]
@@ -2,7 +2,13 @@ import os
 import uuid
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils.functional import cached_property
+
+from recipe.images import image_variants
 
 
 def recipe_image_file_path(instance, filename):
@@ -23,6 +29,12 @@ class Tag(models.Model):
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-name'],
+                         name='tag_user_name_desc_idx'),
+            GinIndex(fields=['name'], name='tag_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+        ]
 
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
@@ -46,6 +58,12 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-name'],
+                         name='ingredient_user_name_desc_idx'),
+            GinIndex(fields=['name'], name='ingredient_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+        ]
 
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
@@ -59,11 +77,64 @@ class Ingredient(models.Model):
         return self.name
 
 
+class SubqueryArray(models.Subquery):
+    """Collect the single column of a subquery into a Postgres array"""
+    template = 'ARRAY(%(subquery)s)'
+    output_field = ArrayField(models.IntegerField())
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def _related_ids(self, field_name, column):
+        through = self.model._meta.get_field(field_name).remote_field.through
+        return SubqueryArray(
+            through.objects.filter(
+                recipe_id=models.OuterRef('pk')
+            ).order_by(f'-{column}').values(column)
+        )
+
+    def _related_names(self, field_name):
+        related_model = self.model._meta.get_field(field_name).related_model
+        return SubqueryArray(
+            related_model.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by('name').values('name'),
+            output_field=ArrayField(models.CharField(max_length=255)),
+        )
+
+    def with_related_ids(self):
+        """Annotate 'tag_ids' and 'ingredient_ids' in the recipe query"""
+        return self.annotate(
+            tag_ids=self._related_ids('tags', 'tag_id'),
+            ingredient_ids=self._related_ids('ingredients', 'ingredient_id'),
+        )
+
+    def with_related_names(self):
+        """Annotate 'tag_names' and 'ingredient_names' in the recipe query"""
+        return self.annotate(
+            tag_names=self._related_names('tags'),
+            ingredient_names=self._related_names('ingredients'),
+        )
+
+    def with_related_objects(self):
+        """Prefetch tags and ingredients in one query each"""
+        return self.prefetch_related('tags', 'ingredients')
+
+
 class Recipe(models.Model):
     """Recipe object"""
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='recipe_user_id_desc_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx'),
+            # Serves exact and prefix lookups of media file names
+            models.Index(fields=['image'], name='recipe_image_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
 
     title = models.CharField(max_length=255)
     user = models.ForeignKey(
@@ -76,8 +147,36 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Tiny preview data URI and dominant color shown until the image loaded
+    image_placeholder = models.TextField(blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    # Sizes of the thumbnails rendered for the image, see 'recipe.images'
+    image_sizes = ArrayField(models.PositiveIntegerField(), default=list,
+                             blank=True, editable=False)
     created_on = models.DateTimeField(verbose_name="Creation Date",
                                       auto_now_add=True)
+    # Title, tag and ingredient names, kept current by 'recipe.signals'
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.title
+
+    @cached_property
+    def image_variants(self):
+        """URLs of the generated thumbnails by size and format"""
+        return image_variants(self.image.name, self.image_sizes) \
+            if self.image else {}
+
+    @property
+    def thumbnail(self):
+        """Smallest thumbnail URLs by format, for lists"""
+        sizes = sorted(self.image_variants, key=int)
+        return self.image_variants[sizes[0]] if sizes else {}
+
+    @property
+    def preview(self):
+        """Largest thumbnail URLs by format, for detail pages"""
+        sizes = sorted(self.image_variants, key=int)
+        return self.image_variants[sizes[-1]] if sizes else {}
@@ -0,0 +1,77 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    TrigramSimilarity
+from django.db import connection
+from django.db.models import BooleanField, Case, F, Q, Value, When
+
+UPDATE_SEARCH_VECTOR_SQL = '''
+    UPDATE recipe_recipe AS r SET search_vector =
+        setweight(to_tsvector(%(config)s, r.title), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM recipe_tag AS t
+            JOIN recipe_recipe_tags AS rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = r.id
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipe_ingredient AS i
+            JOIN recipe_recipe_ingredients AS ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = r.id
+        ), '')), 'C')
+'''
+
+
+def update_search_vectors(recipe_ids):
+    """Recompute the stored search vector of the given recipes from their
+       title, tag names and ingredient names"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPDATE_SEARCH_VECTOR_SQL + ' WHERE r.id = ANY(%(ids)s)',
+            {'config': settings.RECIPE_SEARCH_CONFIG, 'ids': recipe_ids},
+        )
+        return cursor.rowcount
+
+
+def update_search_vectors_between(first_id, last_id):
+    """Recompute the search vectors of a range of recipe ids"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPDATE_SEARCH_VECTOR_SQL +
+            ' WHERE r.id BETWEEN %(first)s AND %(last)s',
+            {'config': settings.RECIPE_SEARCH_CONFIG,
+             'first': first_id, 'last': last_id},
+        )
+        return cursor.rowcount
+
+
+def search_recipes(queryset, terms):
+    """Filter the queryset by the search terms and order by rank"""
+    query = SearchQuery(terms, config=settings.RECIPE_SEARCH_CONFIG)
+
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-id')
+
+
+def typeahead(queryset, term):
+    """Filter the queryset by names starting with or similar to 'term'.
+       Prefix matches come first, then the most similar names."""
+    prefix = Q(name__iregex=f'^{re.escape(term)}')
+
+    return queryset.filter(
+        prefix | Q(name__trigram_similar=term)
+    ).annotate(
+        is_prefix=Case(When(prefix, then=Value(True)),
+                       default=Value(False),
+                       output_field=BooleanField()),
+        similarity=TrigramSimilarity('name', term),
+    ).order_by('-is_prefix', '-similarity', 'name')[
+        :settings.TYPEAHEAD_LIMIT
+    ]
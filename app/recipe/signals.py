@@ -0,0 +1,228 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_data_version
+from core.storage import is_content_addressed
+from recipe.images import image_placeholder
+from recipe.inverted_index import update_index
+from recipe.search import update_search_vectors
+from recipe.models import Tag, Ingredient, Recipe
+
+
+def _recipe_links_changed(field_name, instance, action, reverse, pk_set):
+    """Keep the inverted index in sync with a change of the m2m links"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Applied on commit, by when a deleted instance has lost its pk
+    instance_id = instance.pk
+    pk_set = set(pk_set or ())
+
+    def apply(index):
+        postings = index.postings(field_name)
+        if reverse:
+            # 'instance' is the tag or ingredient, 'pk_set' holds recipes
+            recipe_ids = postings.setdefault(instance_id, set())
+            if action == 'post_add':
+                recipe_ids.update(pk_set)
+            elif action == 'post_remove':
+                recipe_ids.difference_update(pk_set)
+            else:
+                recipe_ids.clear()
+        else:
+            # 'instance' is the recipe, 'pk_set' holds tags or ingredients
+            attr_ids = list(postings) if action == 'post_clear' else pk_set
+            for attr_id in attr_ids:
+                recipe_ids = postings.setdefault(attr_id, set())
+                if action == 'post_add':
+                    recipe_ids.add(instance_id)
+                else:
+                    recipe_ids.discard(instance_id)
+
+    update_index(instance.user_id, apply)
+
+
+def _refresh_linked_search_vectors(instance, action, reverse, pk_set):
+    """Refresh the search vectors of the recipes whose links changed"""
+    if reverse and action == 'pre_clear':
+        # The links are gone by 'post_clear', so remember them now
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        update_search_vectors([instance.pk])
+    elif action == 'post_clear':
+        update_search_vectors(instance.__dict__.pop('_cleared_recipe_ids', []))
+    else:
+        update_search_vectors(pk_set)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _recipe_links_changed('tags', instance, action, reverse, pk_set)
+    _refresh_linked_search_vectors(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    _recipe_links_changed('ingredients', instance, action, reverse, pk_set)
+    _refresh_linked_search_vectors(instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        recipe_id = instance.pk
+        update_index(instance.user_id,
+                     lambda index: index.recipes.add(recipe_id))
+    if update_fields is None or 'title' in update_fields:
+        update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, **kwargs):
+    """Refresh the recipes using a renamed tag or ingredient"""
+    if not created:
+        update_search_vectors(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    instance._deleted_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.pk
+
+    def apply(index):
+        index.recipes.discard(recipe_id)
+        for postings in (index.tags, index.ingredients):
+            for recipe_ids in postings.values():
+                recipe_ids.discard(recipe_id)
+
+    update_index(instance.user_id, apply)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    tag_id = instance.pk
+    update_index(instance.user_id,
+                 lambda index: index.tags.pop(tag_id, None))
+    update_search_vectors(instance.__dict__.pop('_deleted_recipe_ids', []))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    ingredient_id = instance.pk
+    update_index(instance.user_id,
+                 lambda index: index.ingredients.pop(ingredient_id, None))
+    update_search_vectors(instance.__dict__.pop('_deleted_recipe_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def user_data_changed(sender, instance, **kwargs):
+    """Invalidate the cached responses of the owner"""
+    _bump_on_commit(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def user_links_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _bump_on_commit(instance.user_id)
+
+
+def _bump_on_commit(user_id):
+    # Bumped earlier, a concurrent read of the old rows would be cached
+    # under the new version
+    transaction.on_commit(lambda: bump_data_version(user_id))
+
+
+def _release_image(name):
+    """Drop the recipe's reference to a shared image once committed"""
+    if name and is_content_addressed(name):
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def _loaded_image(instance):
+    """Return the image name the recipe was loaded with, querying it when
+       the field was deferred"""
+    if instance._loaded_image is DEFERRED:
+        instance._loaded_image = Recipe._base_manager.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+
+    return instance._loaded_image
+
+
+@receiver(post_init, sender=Recipe)
+def recipe_loaded(sender, instance, **kwargs):
+    # Reading instance.image would load the field when it was deferred
+    image = instance.__dict__.get('image', DEFERRED)
+    instance._loaded_image = getattr(image, 'name', image)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(sender, instance, **kwargs):
+    if 'image' not in instance.__dict__:
+        # Still deferred, so unchanged
+        instance._uploading_image = False
+        return
+
+    loaded = _loaded_image(instance)
+    # The upload is committed to the storage by the save itself
+    instance._uploading_image = bool(instance.image) and \
+        not instance.image._committed
+
+    if not instance.image:
+        instance.image_placeholder = instance.image_color = ''
+        instance.image_sizes = []
+    elif instance._uploading_image or instance.image.name != loaded:
+        # The thumbnails of the new image are recorded once rendered
+        instance.image_sizes = []
+        try:
+            instance.image_placeholder, instance.image_color = \
+                image_placeholder(instance.image.file)
+        except (IOError, SyntaxError, ValueError):
+            instance.image_placeholder = instance.image_color = ''
+        instance.image.file.seek(0)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    if 'image' not in instance.__dict__:
+        return
+    loaded = instance._loaded_image
+    if instance._uploading_image or loaded != instance.image.name:
+        _release_image(loaded)
+    instance._loaded_image = instance.image.name
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_image_deleting(sender, instance, **kwargs):
+    # The row is gone by post_delete
+    _loaded_image(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    _release_image(instance._loaded_image)
@@ -0,0 +1,219 @@
+import os
+import tempfile
+import time
+from io import StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.cache import get_data_version
+from core.models import StoredFile
+from core.storage import is_content_addressed
+from recipe.models import Recipe, Tag
+from recipe.search import search_recipes
+
+
+class RebuildSearchVectorsCommandTests(TestCase):
+
+    def test_rebuild_search_vectors(self):
+        """Test rebuilding the search vectors of every recipe"""
+        user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=user,
+                title=f'Lentil soup {i}',
+                time_minutes=30,
+                price=5.00,
+            )
+            recipe.tags.add(Tag.objects.create(user=user, name='Winter'))
+        Recipe.objects.update(search_vector=None)
+
+        out = StringIO()
+        call_command('rebuild_search_vectors', batch_size=2, stdout=out)
+
+        self.assertIn('Rebuilt search vectors of 5 recipes', out.getvalue())
+        found = search_recipes(Recipe.objects.all(), 'winter lentil')
+        self.assertEqual(found.count(), 5)
+
+
+class GenerateThumbnailsCommandTests(TestCase):
+
+    @override_settings(RECIPE_THUMBNAIL_SIZES=(16,))
+    def test_generate_thumbnails(self):
+        """Test generating the missing thumbnails with worker processes"""
+        user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=user,
+                title=f'Pancakes {i}',
+                time_minutes=15,
+                price=4.00,
+            )
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+                Image.new('RGB', (40, 30)).save(ntf, format='JPEG')
+                ntf.seek(0)
+                recipe.image.save('test.jpg', ntf)
+            self.addCleanup(recipe.image.delete, save=False)
+            recipes.append(recipe)
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=2, stdout=out)
+
+        self.assertIn('Generated thumbnails of 3 images, 0 failed',
+                      out.getvalue())
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image_sizes, [16])
+            stem = os.path.splitext(recipe.image.path)[0]
+            for ext in ('jpg', 'webp'):
+                self.assertTrue(os.path.exists(f'{stem}.16.{ext}'))
+                os.remove(f'{stem}.16.{ext}')
+
+
+class MigrateImageStorageCommandTests(TestCase):
+
+    @override_settings(RECIPE_THUMBNAIL_SIZES=(16,))
+    def test_migrate_image_storage(self):
+        """Test moving images to shared content addressed files"""
+        user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=user,
+                title=f'Pancakes {i}',
+                time_minutes=15,
+                price=4.00,
+            )
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+                Image.new('RGB', (40, 30)).save(ntf, format='JPEG')
+                ntf.seek(0)
+                recipe.image.save('test.jpg', ntf)
+            recipes.append(recipe)
+        old_paths = [recipe.image.path for recipe in recipes]
+        thumbnail = os.path.splitext(old_paths[0])[0] + '.16.webp'
+        with open(thumbnail, 'wb') as f:
+            f.write(b'thumbnail')
+        version = get_data_version(user.id)
+
+        out = StringIO()
+        call_command('migrate_image_storage', stdout=out)
+
+        self.assertIn('Moved 3 images, 2 were duplicates', out.getvalue())
+        names = {recipe.image.name for recipe in Recipe.objects.all()}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 3)
+        self.assertGreater(get_data_version(user.id), version)
+        for path in old_paths:
+            self.assertFalse(os.path.exists(path))
+
+        recipe = Recipe.objects.first()
+        moved_thumbnail = os.path.splitext(recipe.image.path)[0] + '.16.webp'
+        self.assertTrue(os.path.exists(moved_thumbnail))
+        os.remove(moved_thumbnail)
+        os.remove(recipe.image.path)
+
+
+class GcMediaCommandTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tmpdir.name, RECIPE_THUMBNAIL_SIZES=(16,)
+        )
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def media_file(self, name, age=7200):
+        path = os.path.join(self.tmpdir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_gc_media(self):
+        """Test deleting old files which no recipe refers to"""
+        kept = [
+            self.media_file('uploads/recipe/used.jpg'),
+            self.media_file('uploads/recipe/used.16.webp'),
+            self.media_file('uploads/recipe/young.jpg', age=0),
+            self.media_file('.gitignore'),
+        ]
+        orphans = [
+            self.media_file('uploads/recipe/orphan.jpg'),
+            self.media_file('uploads/recipe/orphan.16.jpg'),
+            self.media_file('uploads/recipe/used.640.jpg'),
+            self.media_file('uploads/recipe/ab/cd/abcd.jpg'),
+            self.media_file('.incoming/tmpupload'),
+        ]
+        StoredFile.objects.create(name='uploads/recipe/ab/cd/abcd.jpg',
+                                  size=10, refs=1)
+        Recipe.objects.create(user=self.user, title='Used', time_minutes=5,
+                              price=1.00, image='uploads/recipe/used.jpg')
+
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn('Would delete 5 of 8 files, reclaiming 50 bytes',
+                      out.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in orphans))
+
+        out = StringIO()
+        call_command('gc_media', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 of 8 files', out.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+        self.assertFalse(StoredFile.objects.exists())
+
+
+class BackfillImagePlaceholdersCommandTests(TestCase):
+
+    def test_backfill_image_placeholders(self):
+        """Test computing placeholders of images stored before"""
+        user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=15,
+            price=4.00,
+        )
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (40, 30), (0, 0, 255)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            recipe.image.save('test.jpg', ntf)
+        self.addCleanup(recipe.image.delete, save=False)
+        Recipe.objects.update(image_placeholder='', image_color='')
+
+        out = StringIO()
+        call_command('backfill_image_placeholders', workers=2, stdout=out)
+
+        self.assertIn('Computed 1 placeholders, 0 images unreadable',
+                      out.getvalue())
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_placeholder.startswith('data:image/'))
+        self.assertTrue(recipe.image_color.startswith('#'))
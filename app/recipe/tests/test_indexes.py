@@ -0,0 +1,94 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from recipe.models import Tag, Ingredient, Recipe
+from recipe.search import typeahead
+
+
+class AccessPatternIndexTests(TestCase):
+    """Test that the planner picks the per-user access pattern indexes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00,
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        # The test tables are tiny, so make sequential scans unattractive
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_recipes_by_user_use_index(self):
+        """Test listing recipes of a user ordered by -id"""
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+        self.assertUsesIndex(queryset, 'recipe_user_id_desc_idx')
+
+    def test_tags_by_user_use_index(self):
+        """Test listing tags of a user ordered by -name"""
+        queryset = Tag.objects.filter(user=self.user).order_by('-name')
+
+        self.assertUsesIndex(queryset, 'tag_user_name_desc_idx')
+
+    def test_ingredients_by_user_use_index(self):
+        """Test listing ingredients of a user ordered by -name"""
+        queryset = Ingredient.objects.filter(
+            user=self.user
+        ).order_by('-name')
+
+        self.assertUsesIndex(queryset, 'ingredient_user_name_desc_idx')
+
+    def test_recipes_by_tags_use_index(self):
+        """Test filtering recipes by tag ids"""
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        queryset = Recipe.objects.filter(
+            user=self.user,
+            tags__id__in=tag_ids,
+        ).values('id')
+
+        self.assertUsesIndex(queryset, 'recipe_tags_tag_recipe_idx')
+
+    def test_recipes_by_ingredients_use_index(self):
+        """Test filtering recipes by ingredient ids"""
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        queryset = Recipe.objects.filter(
+            user=self.user,
+            ingredients__id__in=ingredient_ids,
+        ).values('id')
+
+        self.assertUsesIndex(queryset, 'recipe_ingredients_ingr_recipe_idx')
+
+    def test_typeahead_uses_trigram_index(self):
+        """Test suggesting tag names of a user"""
+        Tag.objects.bulk_create(
+            Tag(user=self.user, name=hashlib.md5(bytes(i)).hexdigest())
+            for i in range(2000)
+        )
+        with connection.cursor() as cursor:
+            # Merge the GIN pending list as VACUUM would in production
+            cursor.execute(
+                "SELECT gin_clean_pending_list('tag_name_trgm_idx')"
+            )
+            cursor.execute('ANALYZE recipe_tag')
+
+        queryset = typeahead(Tag.objects.filter(user=self.user), 'vega')
+
+        self.assertUsesIndex(queryset, 'tag_name_trgm_idx')
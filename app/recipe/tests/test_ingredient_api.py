@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
@@ -128,3 +128,34 @@ class PrivateIngredientsAPITests(TestCase):
         serializer = IngredientSerializer(ingredient)
         self.assertEqual(len(results), 1)
         self.assertIn(serializer.data, results)
+
+    def test_typeahead_ingredients(self):
+        """Test suggesting ingredients by prefix and fuzzy name"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        Ingredient.objects.create(user=user2, name='Tomato')
+        Ingredient.objects.create(user=self.user, name='Cherry tomatoes')
+        Ingredient.objects.create(user=self.user, name='Tomato paste')
+        Ingredient.objects.create(user=self.user, name='Potato')
+
+        res = self.client.get(INGREDIENTS_URL, {'q': 'tomato'})
+        names = [item['name'] for item in res.data]
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(names, ['Tomato paste', 'Cherry tomatoes'])
+
+        res = self.client.get(INGREDIENTS_URL, {'q': 'tomatto'})
+        names = [item['name'] for item in res.data]
+        self.assertIn('Tomato paste', names)
+        self.assertNotIn('Potato', names)
+
+    @override_settings(TYPEAHEAD_LIMIT=2)
+    def test_typeahead_ingredients_limited(self):
+        """Test that suggestions are limited to a few results"""
+        for i in range(5):
+            Ingredient.objects.create(user=self.user, name=f'Pepper {i}')
+
+        res = self.client.get(INGREDIENTS_URL, {'q': 'pep'})
+
+        self.assertEqual(len(res.data), 2)
@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from recipe.inverted_index import get_index, clear_indexes, \
+    bump_generation
+from recipe.models import Tag, Ingredient, Recipe
+
+
+class RecipeInvertedIndexTests(TransactionTestCase):
+    """Test the per-user tag and ingredient inverted index, which follows
+       committed changes only"""
+
+    def setUp(self):
+        clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='Tofu')
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Tofu curry',
+            time_minutes=30,
+            price=5.00,
+        )
+
+    def test_index_is_cached(self):
+        """Test that a current index is not rebuilt"""
+        index = get_index(self.user.id)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_index(self.user.id), index)
+
+    def test_index_follows_m2m_changes(self):
+        """Test that m2m changes update the loaded index in place"""
+        index = get_index(self.user.id)
+
+        self.recipe.tags.add(self.tag)
+        self.assertEqual(index.match('tags', all_of=[self.tag.id]),
+                         {self.recipe.id})
+
+        self.tag.recipe_set.remove(self.recipe)
+        self.assertEqual(index.match('tags', all_of=[self.tag.id]), set())
+
+        self.recipe.ingredients.add(self.ingredient)
+        self.recipe.ingredients.clear()
+        self.assertEqual(
+            index.match('ingredients', any_of=[self.ingredient.id]), set()
+        )
+        self.assertIs(get_index(self.user.id), index)
+
+    def test_index_follows_deletes(self):
+        """Test that deleting recipes and tags updates the index"""
+        self.recipe.tags.add(self.tag)
+        index = get_index(self.user.id)
+
+        self.recipe.delete()
+
+        self.assertEqual(index.recipes, set())
+        self.assertEqual(index.match('tags', none_of=[self.tag.id]), set())
+
+        self.tag.delete()
+        self.assertNotIn(self.tag.id, index.tags)
+
+    def test_index_rebuilt_after_foreign_change(self):
+        """Test that a generation bumped elsewhere forces a rebuild"""
+        index = get_index(self.user.id)
+        bump_generation(self.user.id)
+
+        self.assertIsNot(get_index(self.user.id), index)
+
+    def test_rolled_back_change_leaves_index(self):
+        """Test that a rolled back change doesn't patch the index"""
+        index = get_index(self.user.id)
+
+        try:
+            with transaction.atomic():
+                self.recipe.tags.add(self.tag)
+                # Built from uncommitted links, so not kept
+                self.assertIsNot(get_index(self.user.id), index)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertIs(get_index(self.user.id), index)
+        self.assertEqual(index.match('tags', all_of=[self.tag.id]), set())
+
+    def test_change_applied_on_commit(self):
+        """Test that the index only changes when the transaction commits"""
+        index = get_index(self.user.id)
+
+        with transaction.atomic():
+            self.recipe.tags.add(self.tag)
+            self.assertEqual(index.match('tags', all_of=[self.tag.id]),
+                             set())
+
+        self.assertEqual(index.match('tags', all_of=[self.tag.id]),
+                         {self.recipe.id})
@@ -1,21 +1,32 @@
+import csv
+import io
+import json
 import tempfile
 import os
+import zipfile
+from unittest.mock import patch
 
-from PIL import Image
+from PIL import Image, ImageCms
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.models import StoredFile
 from recipe.models import Recipe, Tag, Ingredient
 
 from recipe.api.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPES_URL = reverse('recipe.api:recipe-list')
+RECIPES_BULK_URL = reverse('recipe.api:recipe-bulk')
+RECIPES_EXPORT_URL = reverse('recipe.api:recipe-export')
 
 
 def image_upload_url(recipe_id):
@@ -232,6 +243,13 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(serializer2.data, results)
         self.assertNotIn(serializer3.data, results)
 
+    def test_filter_recipes_by_invalid_ids(self):
+        """Test that non integer id filters are rejected"""
+        res = self.client.get(RECIPES_URL, {'tags': '1,x'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
     def test_filter_recipes_by_ingredients(self):
         """Test returning recipes with specific ingredients"""
         recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
@@ -255,6 +273,520 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(serializer2.data, results)
         self.assertNotIn(serializer3.data, results)
 
+    def test_retrieve_recipes_constant_queries(self):
+        """Test that listing recipes runs a constant number of queries"""
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        # One COUNT and one SELECT with the related ids as arrays
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.filter(user=self.user)
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(map(dict, res.data['results'])),
+                         serializer.data)
+
+    def test_view_recipe_detail_constant_queries(self):
+        """Test that a recipe detail runs a constant number of queries"""
+        recipe = sample_recipe(user=self.user)
+        for i in range(3):
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        # The recipe plus one prefetch for tags and one for ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 3)
+        self.assertEqual(len(res.data['ingredients']), 3)
+
+    def test_filter_recipes_by_tags_unique(self):
+        """Test that matching several tags returns each recipe once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(res.data['count'], 1)
+
+    def test_filter_recipes_by_all_ingredients_without_tag(self):
+        """Test combining all ingredients with an excluded tag"""
+        recipe1 = sample_recipe(user=self.user, title='Cheese omelette')
+        recipe2 = sample_recipe(user=self.user, title='Cheese souffle')
+        egg = sample_ingredient(user=self.user, name='Egg')
+        cheese = sample_ingredient(user=self.user, name='Cheese')
+        dessert = sample_tag(user=self.user, name='Dessert')
+        recipe1.ingredients.add(egg, cheese)
+        recipe2.ingredients.add(egg, cheese)
+        recipe2.tags.add(dessert)
+
+        res = self.client.get(RECIPES_URL, {
+            'ingredients_all': f'{egg.id},{cheese.id}',
+            'tags_none': f'{dessert.id}',
+        })
+        ids = [item['id'] for item in res.data['results']]
+
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_search_recipes_ranked(self):
+        """Test searching recipes by title, tag and ingredient names"""
+        recipe1 = sample_recipe(user=self.user, title='Chicken curry')
+        recipe2 = sample_recipe(user=self.user, title='Fried rice')
+        recipe2.ingredients.add(sample_ingredient(user=self.user,
+                                                  name='Chicken'))
+        recipe3 = sample_recipe(user=self.user, title='Green salad')
+        recipe3.tags.add(sample_tag(user=self.user, name='Vegetarian'))
+
+        res = self.client.get(RECIPES_URL, {'search': 'chicken'})
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe1.id, recipe2.id])
+
+        res = self.client.get(RECIPES_URL, {'search': 'vegetarian'})
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe3.id])
+
+    def test_search_recipes_ranked_with_cursor_pagination(self):
+        """Test that searches keep their rank order when cursor pagination
+           is asked for"""
+        recipe1 = sample_recipe(user=self.user, title='Chicken curry')
+        recipe2 = sample_recipe(user=self.user, title='Fried rice')
+        recipe2.ingredients.add(sample_ingredient(user=self.user,
+                                                  name='Chicken'))
+        recipe3 = sample_recipe(user=self.user, title='Chicken soup')
+
+        res = self.client.get(RECIPES_URL, {'search': 'chicken',
+                                            'pagination': 'cursor'})
+
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe3.id, recipe1.id, recipe2.id])
+
+    def test_etag_follows_representation(self):
+        """Test that the browsable API doesn't match the JSON ETag"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+        self.assertIn('Accept', res['Vary'])
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='text/html',
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/html; charset=utf-8')
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_view_recipe_detail_not_modified(self):
+        """Test that a current ETag on a recipe detail returns 304"""
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(etag, self.client.get(RECIPES_URL)['ETag'])
+
+    def test_create_recipe_with_many_ingredients_constant_queries(self):
+        """Test that related ids are validated with a single query each"""
+        def create_with(count):
+            ingredients = [
+                sample_ingredient(user=self.user, name=f'{count} {i}')
+                for i in range(count)
+            ]
+            payload = {
+                'title': f'Recipe with {count} ingredients',
+                'ingredients': [i.id for i in ingredients],
+                'tags': [sample_tag(user=self.user).id],
+                'time_minutes': 20,
+                'price': 7.00,
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data['ingredients']), count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create_with(3), create_with(30))
+
+    def test_create_recipe_with_other_users_tags_invalid(self):
+        """Test that tags of other users are rejected all at once"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        own_tag = sample_tag(user=self.user)
+        other_tag1 = sample_tag(user=user2, name='Vegan')
+        other_tag2 = sample_tag(user=user2, name='Dessert')
+        payload = {
+            'title': 'Avocado lime cheesecake',
+            'tags': [own_tag.id, other_tag1.id, other_tag2.id, 999999],
+            'time_minutes': 60,
+            'price': 20.00,
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 3)
+        for pk in (other_tag1.id, other_tag2.id, 999999):
+            self.assertTrue(any(f'"{pk}"' in e for e in res.data['tags']))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_with_invalid_tag_pk(self):
+        """Test that non integer tag ids are rejected"""
+        payload = {
+            'title': 'Avocado lime cheesecake',
+            'tags': ['abc'],
+            'time_minutes': 60,
+            'price': 20.00,
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
+    def test_retrieve_recipes_cursor_pagination(self):
+        """Test paging through recipes with cursor tokens"""
+        recipes = [sample_recipe(user=self.user, title=f'Recipe {i}')
+                   for i in range(7)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'pagination': 'cursor'})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in ctx.captured_queries)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertIsNone(res.data['previous'])
+        first_ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(first_ids, [r.id for r in reversed(recipes)][:5])
+
+        res = self.client.get(res.data['next'])
+        second_ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(second_ids, [recipes[1].id, recipes[0].id])
+        self.assertIsNone(res.data['next'])
+        self.assertIsNotNone(res.data['previous'])
+
+    def test_retrieve_recipes_page_number_by_default(self):
+        """Test that page number pagination stays the default format"""
+        sample_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 1)
+
+    def test_bulk_create_recipes_constant_queries(self):
+        """Test creating many recipes with a fixed number of queries"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+
+        def create_with(count):
+            payload = [{
+                'title': f'Recipe {count} {i}',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id],
+                'time_minutes': 10,
+                'price': 5.00,
+            } for i in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_BULK_URL, payload,
+                                       format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data), count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create_with(2), create_with(20))
+        recipe = Recipe.objects.get(title='Recipe 20 7')
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_create_recipes_invalid_item(self):
+        """Test that one invalid item rejects the whole batch"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {'title': 'Good', 'tags': [], 'ingredients': [],
+             'time_minutes': 5, 'price': 1.00},
+            {'title': 'Bad', 'tags': [other_tag.id], 'ingredients': [],
+             'time_minutes': 5, 'price': 1.00},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('tags', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_recipes_too_many(self):
+        """Test that batches over the limit are rejected"""
+        payload = [{'title': 'Recipe', 'tags': [], 'ingredients': [],
+                    'time_minutes': 5, 'price': 1.00}] * 3
+
+        with self.settings(BULK_MAX_ITEMS=2):
+            res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_recipes(self):
+        """Test partially updating many recipes at once"""
+        recipe1 = sample_recipe(user=self.user, title='Pasta')
+        recipe2 = sample_recipe(user=self.user, title='Pizza')
+        recipe2.tags.add(sample_tag(user=self.user))
+        tag = sample_tag(user=self.user, name='Italian')
+        payload = [
+            {'id': recipe1.id, 'title': 'Spaghetti'},
+            {'id': recipe2.id, 'tags': [tag.id], 'price': 9.00},
+        ]
+
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[1]['tags'], [tag.id])
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe1.title, 'Spaghetti')
+        self.assertEqual(recipe2.price, 9)
+        self.assertEqual(list(recipe2.tags.all()), [tag])
+
+    def test_bulk_update_recipes_not_found(self):
+        """Test that unknown or other users' recipes are not updated"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        recipe = sample_recipe(user=self.user)
+        other = sample_recipe(user=user2, title='Other')
+        payload = [
+            {'id': recipe.id, 'title': 'Changed'},
+            {'id': other.id, 'title': 'Changed'},
+        ]
+
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        self.assertFalse(Recipe.objects.filter(title='Changed').exists())
+
+    def test_bulk_delete_recipes(self):
+        """Test deleting many recipes and reporting unknown ids"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        recipe = sample_recipe(user=self.user)
+        other = sample_recipe(user=user2)
+
+        res = self.client.delete(RECIPES_BULK_URL,
+                                 {'ids': [recipe.id, other.id]},
+                                 format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': recipe.id, 'status': 'deleted'},
+            {'id': other.id, 'status': 'not_found'},
+        ])
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+
+    def test_bulk_delete_recipes_list_body(self):
+        """Test that a list body instead of an object is rejected"""
+        recipe = sample_recipe(user=self.user)
+
+        res = self.client.delete(RECIPES_BULK_URL, [recipe.id],
+                                 format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_export_recipes_ndjson(self):
+        """Test streaming the user's recipes as JSON lines"""
+        user2 = get_user_model().objects.create_user(
+            'other@psykweb.com',
+            'testpass'
+        )
+        sample_recipe(user=user2, title='Not mine')
+        recipe = sample_recipe(user=self.user, title='Goulash', price=9.5)
+        recipe.tags.add(sample_tag(user=self.user, name='Dinner'))
+        recipe.ingredients.add(sample_ingredient(user=self.user, name='Beef'),
+                               sample_ingredient(user=self.user))
+
+        res = self.client.get(RECIPES_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'id': recipe.id,
+            'title': 'Goulash',
+            'time_minutes': 10,
+            'price': '9.50',
+            'link': '',
+            'image': None,
+            'tags': ['Dinner'],
+            'ingredients': ['Beef', 'Cinnamon'],
+        }])
+
+    def test_export_recipes_csv_filtered(self):
+        """Test exporting the recipes matching the list filters as CSV"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        recipe = sample_recipe(user=self.user, title='Falafel')
+        recipe.tags.add(tag, sample_tag(user=self.user, name='Lunch'))
+        sample_recipe(user=self.user, title='Steak')
+
+        res = self.client.get(RECIPES_EXPORT_URL, {'as': 'csv',
+                                                   'tags': tag.id})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Falafel')
+        self.assertEqual(rows[0]['tags'], 'Lunch;Vegan')
+
+    def test_export_recipes_invalid_format(self):
+        """Test that unknown export formats are rejected"""
+        res = self.client.get(RECIPES_EXPORT_URL, {'as': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PrivateRecipeApiCommitTests(TransactionTestCase):
+    """Test the recipe API caches, which follow committed writes only"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@psykweb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_filter_recipes_by_all_tags(self):
+        """Test returning recipes which have every listed tag"""
+        recipe1 = sample_recipe(user=self.user, title='Vegan brownies')
+        recipe2 = sample_recipe(user=self.user, title='Vegan curry')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        res = self.client.get(RECIPES_URL,
+                              {'tags_all': f'{tag1.id},{tag2.id}'})
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe1.id])
+
+        # The index follows m2m changes made after it was loaded
+        recipe2.tags.add(tag2)
+        res = self.client.get(RECIPES_URL,
+                              {'tags_all': f'{tag1.id},{tag2.id}'})
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe2.id, recipe1.id])
+
+    def test_search_follows_renamed_tag(self):
+        """Test that renaming a tag refreshes the recipe search vector"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+        tag = sample_tag(user=self.user, name='Breakfast')
+        recipe.tags.add(tag)
+
+        tag.name = 'Brunch'
+        tag.save()
+
+        res = self.client.get(RECIPES_URL, {'search': 'brunch'})
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+        res = self.client.get(RECIPES_URL, {'search': 'breakfast'})
+        self.assertEqual(res.data['results'], [])
+
+        tag.delete()
+        res = self.client.get(RECIPES_URL, {'search': 'brunch'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_retrieve_recipes_cache_follows_m2m_changes(self):
+        """Test that m2m changes invalidate the cached recipe lists"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['tags'], [])
+
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['tags'], [tag.id])
+
+    def test_retrieve_recipes_not_modified(self):
+        """Test that a current ETag on the recipe list returns 304"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        sample_recipe(user=self.user, title='Another recipe')
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_conditional_update_recipe(self):
+        """Test that updates honour the If-Match precondition"""
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.patch(url, {'title': 'Chicken tikka'},
+                                HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+        # The first update made the ETag stale
+        res = self.client.patch(url, {'title': 'Lamb curry'},
+                                HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Chicken tikka')
+
+    def test_bulk_create_recipes_searchable_and_filterable(self):
+        """Test that bulk created recipes are indexed"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        self.client.get(RECIPES_URL, {'tags': tag.id})
+        payload = [{
+            'title': 'Avocado toast',
+            'tags': [tag.id],
+            'ingredients': [],
+            'time_minutes': 5,
+            'price': 3.00,
+        }]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+        recipe_id = res.data[0]['id']
+
+        res = self.client.get(RECIPES_URL, {'tags': tag.id})
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe_id])
+        res = self.client.get(RECIPES_URL, {'search': 'vegan avocado'})
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe_id])
+
 
 class RecipeImageUploadTests(TestCase):
     """Tests image uploading to the 'Recipe' model."""
@@ -291,3 +823,198 @@ class RecipeImageUploadTests(TestCase):
         res = self.client.post(url, {'image': 'notimage'}, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deferred_image_not_loaded(self):
+        """Test that recipes loaded without their image don't query it"""
+        with self.assertNumQueries(1):
+            recipe = Recipe.objects.defer('image').get(id=self.recipe.id)
+        recipe.title = 'Renamed'
+        # The update and the refresh of the search vector
+        with self.assertNumQueries(2):
+            recipe.save()
+
+        self.assertNotIn('image', recipe.__dict__)
+
+    def test_export_recipes_zip_with_images(self):
+        """Test streaming a zip archive of the recipes and their images"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(image_upload_url(self.recipe.id),
+                             {'image': ntf}, format='multipart')
+        self.recipe.refresh_from_db()
+
+        res = self.client.get(RECIPES_EXPORT_URL, {'as': 'zip'})
+
+        self.assertEqual(res['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        # The local header has the ZIP64 extra field (id 1), as the size
+        # isn't known up front
+        archive.fp.seek(archive.getinfo('recipes.ndjson').header_offset)
+        header = archive.fp.read(30)
+        archive.fp.seek(int.from_bytes(header[26:28], 'little'), 1)
+        self.assertEqual(archive.fp.read(2), b'\x01\x00')
+        recipes = archive.read('recipes.ndjson').decode().splitlines()
+        image = archive.read(json.loads(recipes[0])['image'])
+        with open(self.recipe.image.path, 'rb') as f:
+            self.assertEqual(image, f.read())
+
+    @override_settings(RECIPE_THUMBNAIL_WORKERS=0,
+                       RECIPE_THUMBNAIL_SIZES=(20, 50))
+    def test_upload_image_generates_thumbnails(self):
+        """Test that uploading an image renders its thumbnails"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (120, 80)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        stem = os.path.splitext(self.recipe.image.path)[0]
+        paths = [f'{stem}.{size}.{ext}'
+                 for size in (20, 50) for ext in ('jpg', 'webp')]
+        for path in paths:
+            self.addCleanup(os.remove, path)
+
+        self.assertEqual(set(res.data['thumbnails']), {'20', '50'})
+        self.assertTrue(
+            res.data['thumbnails']['20']['webp'].startswith('http://')
+        )
+        with Image.open(f'{stem}.50.webp') as thumbnail:
+            self.assertEqual(thumbnail.size, (50, 50))
+
+        self.assertEqual(self.recipe.image_sizes, [20, 50])
+        with patch.object(default_storage, 'exists') as exists:
+            res = self.client.get(RECIPES_URL)
+        exists.assert_not_called()
+        self.assertEqual(set(res.data['results'][0]['thumbnails']),
+                         {'20', '50'})
+
+    def upload_image(self, image, **save_kwargs):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            image.save(ntf, format='JPEG', **save_kwargs)
+            ntf.seek(0)
+            return self.client.post(url, {'image': ntf}, format='multipart')
+
+    @override_settings(RECIPE_IMAGE_MAX_EDGE=50)
+    def test_upload_image_normalized(self):
+        """Test that uploads are turned upright, downscaled and stripped"""
+        # Minimal big endian EXIF block with orientation 6 (rotate 90 CW)
+        exif = (b'Exif\x00\x00MM\x00*\x00\x00\x00\x08\x00\x01'
+                b'\x01\x12\x00\x03\x00\x00\x00\x01\x00\x06\x00\x00'
+                b'\x00\x00\x00\x00')
+        res = self.upload_image(Image.new('RGB', (200, 100)), exif=exif)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.size, (25, 50))
+            self.assertNotIn('exif', image.info)
+
+    def test_upload_alpha_png_stripped(self):
+        """Test that PNG uploads with transparency lose their ICC profile"""
+        profile = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')
+        ).tobytes()
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGBA', (20, 20)).save(ntf, format='PNG',
+                                             icc_profile=profile)
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertNotIn('icc_profile', image.info)
+
+    def test_upload_image_computes_placeholder(self):
+        """Test that uploads store a tiny preview and dominant color"""
+        res = self.upload_image(Image.new('RGB', (40, 30), (200, 10, 10)))
+
+        self.assertTrue(
+            res.data['image_placeholder'].startswith('data:image/jpeg;base64,')
+        )
+        self.assertLess(len(res.data['image_placeholder']), 1000)
+        red, green, blue = (int(res.data['image_color'][i:i + 2], 16)
+                            for i in (1, 3, 5))
+        self.assertGreater(red, 180)
+        self.assertLess(green + blue, 60)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['image_color'],
+                         Recipe.objects.get(id=self.recipe.id).image_color)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100)
+    def test_upload_image_too_many_pixels(self):
+        """Test that images with too many pixels are rejected"""
+        res = self.upload_image(Image.new('RGB', (20, 20)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=10)
+    def test_upload_image_too_large(self):
+        """Test that oversized image files are rejected"""
+        res = self.upload_image(Image.new('RGB', (20, 20)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+
+@override_settings(DEFAULT_FILE_STORAGE='core.storage.ContentAddressedStorage',
+                   RECIPE_THUMBNAIL_WORKERS=0, RECIPE_THUMBNAIL_SIZES=())
+class SharedImageStorageTests(TransactionTestCase):
+    """Tests recipe images in the content addressed storage."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@psykweb.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def upload(self, recipe, color):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10), color).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(image_upload_url(recipe.id), {'image': ntf},
+                             format='multipart')
+        recipe.refresh_from_db()
+        return recipe.image.name
+
+    def test_identical_images_shared_until_last_recipe_deleted(self):
+        """Test that identical uploads share a file released on delete"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+
+        name = self.upload(recipe1, 'red')
+        self.assertEqual(self.upload(recipe2, 'red'), name)
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 2)
+        path = recipe1.image.path
+
+        self.client.delete(detail_url(recipe1.id))
+        self.assertTrue(os.path.exists(path))
+
+        self.client.delete(detail_url(recipe2.id))
+        self.assertFalse(os.path.exists(path))
+
+    def test_replaced_image_released(self):
+        """Test that replacing an image drops the old reference"""
+        recipe = sample_recipe(user=self.user)
+        old = self.upload(recipe, 'red')
+        old_path = recipe.image.path
+
+        self.assertEqual(self.upload(recipe, 'red'), old)
+        self.assertEqual(StoredFile.objects.get(name=old).refs, 1)
+
+        new = self.upload(recipe, 'blue')
+        self.addCleanup(recipe.image.delete)
+        self.assertNotEqual(new, old)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertFalse(StoredFile.objects.filter(name=old).exists())
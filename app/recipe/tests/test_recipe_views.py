@@ -1,11 +1,15 @@
+import os
 import tempfile
 from PIL import Image
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 
+from core.api.tokens import issue_access_token
+from recipe.images import record_variants, render_variants
 from recipe.models import Recipe
 
 RECIPE_LIST_URL = reverse('recipe:recipe_list')
@@ -96,6 +100,34 @@ class PrivateRecipeViewsTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTemplateUsed(response, 'recipe/recipe_list.html')
 
+    def test_recipe_list_search_GET(self):
+        """Test searching the List of Recipes."""
+        response = self.client.get(RECIPE_LIST_URL, {'search': 'first'})
+        objects = list(response.context['list_objects'])
+        self.assertEqual(objects, [self.recipe])
+
+        response = self.client.get(RECIPE_LIST_URL, {'search': 'missing'})
+        self.assertEqual(list(response.context['list_objects']), [])
+
+    @override_settings(RECIPE_THUMBNAIL_SIZES=(8, 16))
+    def test_recipe_list_and_detail_render_thumbnails(self):
+        """Test that the pages use the generated thumbnails."""
+        render_variants(self.recipe.image.path, (8, 16), 80)
+        record_variants(self.recipe.image.name, (8, 16))
+        stem = os.path.splitext(self.recipe.image.path)[0]
+        for size in (8, 16):
+            for ext in ('jpg', 'webp'):
+                self.addCleanup(os.remove, f'{stem}.{size}.{ext}')
+        url_stem = os.path.splitext(self.recipe.image.url)[0]
+
+        response = self.client.get(RECIPE_LIST_URL)
+        self.assertContains(response, f'{url_stem}.8.webp')
+        self.assertContains(response, f'{url_stem}.8.jpg')
+
+        url = crud_url_by_action_and_pk('detail', self.recipe.id)
+        response = self.client.get(url)
+        self.assertContains(response, f'{url_stem}.16.webp')
+
     def test_recipe_detail_GET(self):
         """Test retrieving Detail of Recipe."""
         url = crud_url_by_action_and_pk('detail', self.recipe.id)
@@ -140,6 +172,27 @@ class PrivateRecipeViewsTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_recipe_update_GET_forbidden_for_staff(self):
+        """Test retrieving Update of another user's Recipe is forbidden
+           for staff who aren't superusers."""
+        staff = get_user_model().objects.create_staffuser(
+            'staff@domain.com',
+            'testpass1'
+        )
+        self.client.force_login(staff)
+
+        url = crud_url_by_action_and_pk('update', self.recipe.id)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_recipe_delete_POST_missing_recipe_not_found(self):
+        """Test deleting a missing Recipe is not found."""
+        url = crud_url_by_action_and_pk('delete', self.recipe.id + 1000)
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_recipe_update_GET_always_accessible_for_superuser(self):
         """Test retrieving Update of Recipe is always accessible
            for superuser."""
@@ -161,3 +214,166 @@ class PrivateRecipeViewsTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTemplateUsed(response, 'recipe/recipe_delete.html')
+
+
+class RecipeImageMediaTests(TestCase):
+    """Test serving recipe images under MEDIA_URL"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'testpass1'
+        )
+        self.client.force_login(self.user)
+        self.recipe = Recipe.objects.create(title='First Recipe', price=10.0,
+                                            time_minutes=15, user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (40, 40)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.recipe.image.save('test.jpg', ntf)
+        self.addCleanup(self.recipe.image.delete, save=False)
+        with open(self.recipe.image.path, 'rb') as f:
+            self.content = f.read()
+        self.url = self.recipe.image.url
+
+    def test_media_GET_streams_file_with_validators(self):
+        """Test that the owner gets the image with caching headers"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_media_GET_not_modified(self):
+        """Test that a matching 'If-None-Match' gets an empty 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_media_GET_range(self):
+        """Test that a byte range gets a partial response"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[10:20])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(self.content)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[-5:])
+
+    def test_media_GET_range_not_satisfiable(self):
+        """Test that a range past the end of the file gets a 416"""
+        response = self.client.get(
+            self.url, HTTP_RANGE=f'bytes={len(self.content)}-'
+        )
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_media_GET_stale_if_range_sends_whole_file(self):
+        """Test that a range with an outdated 'If-Range' is ignored"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_media_GET_other_users_recipe_page(self):
+        """Test that the image on another user's recipe page loads"""
+        another_user = get_user_model().objects.create_user(
+            'another_user@domain.com',
+            'testpass1'
+        )
+        self.client.force_login(another_user)
+        url = crud_url_by_action_and_pk('detail', self.recipe.id)
+        response = self.client.get(url)
+        self.assertContains(response, f'src="{self.url}"')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_media_GET_not_found_for_anonymous(self):
+        """Test that anonymous requests get a 404"""
+        self.client.logout()
+
+        self.assertEqual(self.client.get(self.url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_OWNER_ONLY=True)
+    def test_media_GET_not_found_for_other_users(self):
+        """Test that other users and anonymous requests get a 404 when
+           images are private to their owner"""
+        another_user = get_user_model().objects.create_user(
+            'another_user@domain.com',
+            'testpass1'
+        )
+        self.client.force_login(another_user)
+        self.assertEqual(self.client.get(self.url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_media_GET_with_token(self):
+        """Test that API clients authenticate with their token"""
+        token = Token.objects.create(user=self.user)
+        self.client.logout()
+
+        response = self.client.get(self.url,
+                                   HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_media_GET_with_access_token(self):
+        """Test that API clients authenticate with a bearer access token"""
+        token, _ = issue_access_token(self.user)
+        self.client.logout()
+
+        response = self.client.get(self.url,
+                                   HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(RECIPE_THUMBNAIL_SIZES=(8,))
+    def test_media_GET_thumbnail(self):
+        """Test that thumbnails follow the access of their image"""
+        render_variants(self.recipe.image.path, (8,), 80)
+        stem = os.path.splitext(self.recipe.image.path)[0]
+        for ext in ('jpg', 'webp'):
+            self.addCleanup(os.remove, f'{stem}.8.{ext}')
+        url = f'{os.path.splitext(self.url)[0]}.8.webp'
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+    def test_media_GET_unreferenced_file_not_found(self):
+        """Test that files no recipe refers to are not served"""
+        response = self.client.get(self.url.replace('.jpg', '.png'))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='x-accel-redirect',
+                       MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_media_GET_x_accel_redirect(self):
+        """Test that the file is handed to nginx when configured"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{self.recipe.image.name}')
+        self.assertEqual(response.content, b'')
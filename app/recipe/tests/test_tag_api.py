@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -11,6 +13,7 @@ from recipe.api.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe.api:tag-list')
+TAGS_BULK_URL = reverse('recipe.api:tag-bulk')
 
 
 class PublicTagsApiTests(TestCase):
@@ -133,3 +136,183 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tag)
         self.assertEqual(len(results), 1)
         self.assertIn(serializer.data, results)
+
+    def test_retrieve_tags_assigned_without_distinct(self):
+        """Test filtering assigned tags with a semi-join"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe = Recipe.objects.create(
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            user=self.user
+        )
+        recipe.tags.add(tag)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_retrieve_tags_min_recipes(self):
+        """Test filtering tags used by at least N recipes"""
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        tag3 = Tag.objects.create(user=self.user, name='Dinner')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=3.00,
+                user=self.user
+            )
+            recipe.tags.add(tag1)
+            if i == 0:
+                recipe.tags.add(tag2)
+
+        res = self.client.get(TAGS_URL, {'min_recipes': 2})
+        names = [item['name'] for item in res.data['results']]
+        self.assertEqual(names, [tag1.name])
+
+        res = self.client.get(TAGS_URL, {'min_recipes': 1})
+        names = [item['name'] for item in res.data['results']]
+        self.assertEqual(names, [tag2.name, tag1.name])
+        self.assertNotIn(tag3.name, names)
+
+    def test_retrieve_tags_invalid_filter(self):
+        """Test that non integer filters are rejected"""
+        res = self.client.get(TAGS_URL, {'min_recipes': 'abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('min_recipes', res.data)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 'yes'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_tags_cursor_pagination(self):
+        """Test paging through tags by name with cursor tokens"""
+        names = ['Dinner', 'Breakfast', 'Vegan', 'Lunch', 'Snack', 'Brunch']
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'pagination': 'cursor'})
+        first = [item['name'] for item in res.data['results']]
+        res = self.client.get(res.data['next'])
+        second = [item['name'] for item in res.data['results']]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(first + second, sorted(names, reverse=True))
+
+    def test_retrieve_tags_cached(self):
+        """Test that repeated tag lists are served from the cache"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        first = self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(TAGS_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+
+    def test_retrieve_tags_cache_keyed_on_params(self):
+        """Test that differently filtered lists are cached separately"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            user=self.user
+        )
+        recipe.tags.add(tag)
+
+        res_all = self.client.get(TAGS_URL)
+        res_assigned = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res_all.data['count'], 2)
+        self.assertEqual(res_assigned.data['count'], 1)
+
+    def test_retrieve_tags_not_modified(self):
+        """Test that a current ETag on the tag list returns 304"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(TAGS_URL, {'q': 'veg'},
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_create_tags(self):
+        """Test creating many tags at once"""
+        payload = [{'name': 'Vegan'}, {'name': 'Dessert'}]
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([t['name'] for t in res.data], ['Vegan', 'Dessert'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_update_tags_refreshes_recipe_search(self):
+        """Test that renaming tags in bulk updates recipe search"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            title='Porridge',
+            time_minutes=5,
+            price=2.00,
+            user=self.user
+        )
+        recipe.tags.add(tag)
+
+        res = self.client.patch(TAGS_BULK_URL,
+                                [{'id': tag.id, 'name': 'Breakfast'}],
+                                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            Recipe.objects.filter(search_vector='breakfast').exists()
+        )
+
+    def test_bulk_update_and_delete_tags_ignore_typeahead(self):
+        """Test that bulk writes aren't limited by the typeahead term"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.patch(f'{TAGS_BULK_URL}?q=veg',
+                                [{'id': tag.id, 'name': 'Vegetarian'}],
+                                format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.delete(f'{TAGS_BULK_URL}?q=veg',
+                                 {'ids': [tag.id]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': tag.id, 'status': 'deleted'}])
+
+
+class PrivateTagsApiCommitTests(TransactionTestCase):
+    """Test the tags API caches, which follow committed writes only"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@psykweb.com',
+            password='testpass'
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_tags_cache_invalidated(self):
+        """Test that writes of the user invalidate the cached lists"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data['count'], 2)
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(TAGS_URL)
+        names = [item['name'] for item in res.data['results']]
+        self.assertIn('Vegetarian', names)
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
@@ -146,3 +148,23 @@ class PrivateTagViewsTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTemplateUsed(response, 'tag/tag_delete.html')
+
+    def test_tag_update_GET_missing_tag_not_found(self):
+        """Test retrieving Update of a missing Tag is not found."""
+        url = crud_url_by_action_and_pk('update', self.tag.id + 1000)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tag_update_GET_fetches_tag_once(self):
+        """Test that the ownership check and the view share the Tag."""
+        url = crud_url_by_action_and_pk('update', self.tag.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        tag_queries = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "recipe_tag"' in query['sql']
+        ]
+        self.assertEqual(len(tag_queries), 1)
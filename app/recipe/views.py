@@ -1,31 +1,67 @@
-from django.views.generic import DetailView
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.views.generic import DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from django.urls import reverse_lazy
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 
+from core.media import serve_file
+from core.storage import is_content_addressed
 from core.views import PaginatedListView
 from .models import Tag, Ingredient, Recipe
 from .forms.tag_forms import TagModelForm
 from .forms.ingredient_forms import IngredientModelForm
 from .forms.recipe_forms import RecipeModelForm
+from .images import queue_variants, source_stem
+from .search import search_recipes
+
+##########
+# Mixins #
+##########
+
 
-##############
-# Tag Mixins #
-##############
+class OwnerPassesTestMixin(UserPassesTestMixin):
+    """Only lets the owner of the object and the users may_edit_any()
+       accepts, staff and superusers by default, through.
 
+       The object is fetched once, compared by 'user_id' without loading
+       the user, and reused by get_object(). A missing object is a 404."""
 
-class TagUserPassesTestMixin(UserPassesTestMixin):
     def test_func(self):
-        tag = Tag.objects.get(pk=self.kwargs['pk'])
+        self.owned_object = super().get_object()
         req_user = self.request.user
 
-        if not req_user.is_staff and not req_user.is_superuser:
-            if tag.user.id != req_user.id:
+        if not self.may_edit_any(req_user):
+            if self.owned_object.user_id != req_user.id:
                 return False
 
         return True
 
+    def may_edit_any(self, user):
+        """Return whether the user may edit objects of other users"""
+        return user.is_staff or user.is_superuser
+
+    def get_object(self, queryset=None):
+        if queryset is None and hasattr(self, 'owned_object'):
+            return self.owned_object
+
+        return super().get_object(queryset)
+
+
+class RecipeOwnerPassesTestMixin(OwnerPassesTestMixin):
+
+    def may_edit_any(self, user):
+        # Only users who are both staff and superuser edit others' recipes
+        return user.is_staff and user.is_superuser
+
 
 #############
 # Tag Views #
@@ -42,13 +78,13 @@ class TagDetail(LoginRequiredMixin, DetailView):
     template_name = 'tag/tag_detail.html'
 
 
-class TagUpdate(LoginRequiredMixin, TagUserPassesTestMixin, UpdateView):
+class TagUpdate(LoginRequiredMixin, OwnerPassesTestMixin, UpdateView):
     model = Tag
     form_class = TagModelForm
     template_name = 'tag/tag_update.html'
 
 
-class TagDelete(LoginRequiredMixin, TagUserPassesTestMixin, DeleteView):
+class TagDelete(LoginRequiredMixin, OwnerPassesTestMixin, DeleteView):
     model = Tag
     template_name = 'tag/tag_delete.html'
     success_url = reverse_lazy('recipe:tag_list')
@@ -68,23 +104,6 @@ class TagCreate(LoginRequiredMixin, CreateView):
         return super(TagCreate, self).form_valid(form)
 
 
-#####################
-# Ingredient Mixins #
-#####################
-
-class IngredientUserPassesTestMixin(UserPassesTestMixin):
-
-    def test_func(self):
-        ingredient = Ingredient.objects.get(pk=self.kwargs['pk'])
-        req_user = self.request.user
-
-        if not req_user.is_staff and not req_user.is_superuser:
-            if ingredient.user.id != req_user.id:
-                return False
-
-        return True
-
-
 ####################
 # Ingredient Views #
 ####################
@@ -101,7 +120,7 @@ class IngredientDetail(LoginRequiredMixin, DetailView):
 
 
 class IngredientUpdate(LoginRequiredMixin,
-                       IngredientUserPassesTestMixin,
+                       OwnerPassesTestMixin,
                        UpdateView):
     model = Ingredient
     form_class = IngredientModelForm
@@ -109,7 +128,7 @@ class IngredientUpdate(LoginRequiredMixin,
 
 
 class IngredientDelete(LoginRequiredMixin,
-                       IngredientUserPassesTestMixin,
+                       OwnerPassesTestMixin,
                        DeleteView):
     model = Ingredient
     template_name = 'ingredient/ingredient_delete.html'
@@ -130,23 +149,6 @@ class IngredientCreate(LoginRequiredMixin, CreateView):
         return super(IngredientCreate, self).form_valid(form)
 
 
-#################
-# Recipe Mixins #
-#################
-
-class RecipeUserPassesTestMixin(UserPassesTestMixin):
-
-    def test_func(self):
-        recipe = Recipe.objects.get(pk=self.kwargs['pk'])
-        req_user = self.request.user
-
-        if not req_user.is_staff or not req_user.is_superuser:
-            if recipe.user.id != req_user.id:
-                return False
-
-        return True
-
-
 ################
 # Recipe Views #
 ################
@@ -156,20 +158,36 @@ class RecipeList(LoginRequiredMixin, PaginatedListView):
     queryset = Recipe.objects.all()
     template_name = 'recipe/recipe_list.html'
 
+    def get_queryset(self):
+        queryset = super(RecipeList, self).get_queryset()
+        search = self.request.GET.get('search')
+        if search:
+            queryset = search_recipes(queryset, search)
+
+        return queryset
+
 
 class RecipeDetail(LoginRequiredMixin, DetailView):
     model = Recipe
     template_name = 'recipe/recipe_detail.html'
 
 
-class RecipeUpdate(LoginRequiredMixin, RecipeUserPassesTestMixin, UpdateView):
+class RecipeUpdate(LoginRequiredMixin, RecipeOwnerPassesTestMixin,
+                   UpdateView):
     model = Recipe
     form_class = RecipeModelForm
     template_name = 'recipe/recipe_update.html'
     success_url = reverse_lazy('recipe:recipe_list')
 
+    def form_valid(self, form):
+        response = super(RecipeUpdate, self).form_valid(form)
+        if 'image' in form.changed_data:
+            queue_variants(self.object)
+        return response
+
 
-class RecipeDelete(LoginRequiredMixin, RecipeUserPassesTestMixin, DeleteView):
+class RecipeDelete(LoginRequiredMixin, RecipeOwnerPassesTestMixin,
+                   DeleteView):
     model = Recipe
     template_name = 'recipe/recipe_delete.html'
     success_url = reverse_lazy('recipe:recipe_list')
@@ -186,4 +204,62 @@ class RecipeCreate(LoginRequiredMixin, CreateView):
         user = self.request.user
         form.instance.user = user
         form.save()
+        queue_variants(form.instance)
         return super(RecipeCreate, self).form_valid(form)
+
+
+###############
+# Media Views #
+###############
+
+class RecipeImageMedia(View):
+    """Serve recipe images and their thumbnails under MEDIA_URL.
+
+       The file is never read into memory: it is either handed to the
+       front proxy or streamed with range and conditional request support."""
+
+    def get_user(self, request):
+        if request.user.is_authenticated:
+            return request.user
+        # Accept every credential the API does, e.g. bearer access tokens
+        api_request = Request(request, authenticators=[
+            auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ])
+        try:
+            user = api_request.user
+        except AuthenticationFailed:
+            return None
+
+        return user if user.is_authenticated else None
+
+    def is_permitted(self, user, name):
+        """Return whether the user may see the image or thumbnail 'name',
+           using the recipe image index"""
+        recipes = Recipe.objects.order_by()
+        if settings.MEDIA_OWNER_ONLY and not user.is_staff:
+            recipes = recipes.filter(user_id=user.id)
+
+        stem = source_stem(name)
+        if stem is None:
+            return recipes.filter(image=name).exists()
+
+        images = recipes.filter(
+            image__startswith=f'{stem}.'
+        ).values_list('image', flat=True)[:10]
+        return any(os.path.splitext(image)[0] == stem for image in images)
+
+    def get(self, request, name):
+        user = self.get_user(request)
+        # Not found rather than forbidden, so names can't be probed
+        if user is None or not self.is_permitted(user, name):
+            raise Http404
+
+        try:
+            path = default_storage.path(name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+
+        return serve_file(request, name, path,
+                          immutable=is_content_addressed(name))